@@ -0,0 +1,71 @@
+"""YAMLローダーの構文解析の速度を比較します。
+
+    poetry run python benchmarks/yaml_loader.py [--tasks 5000] [--repeat 3]
+
+数MBのプロファイルを生成し、pure PythonのPyAppLoaderとlibyamlのCAppLoaderで読み込む時間を計測します。
+"""
+import argparse
+import time
+
+from requests_job.parser import CAppLoader, Parser, PyAppLoader
+
+
+def generate_profile(tasks: int) -> str:
+    lines = [
+        "base_url: http://testserver",
+        "env:",
+        "  APP_NAME: ${ env['PATH'] }",
+        "jobs:",
+        "  - name: generated",
+        "    tasks:",
+    ]
+    for i in range(tasks):
+        lines += [
+            f"      - name: task_{i}",
+            "        url: /users/{id}",
+            "        method: post",
+            "        kwargs:",
+            f"          id: {i}",
+            "        headers:",
+            f"          x-request-id: !ref request_{i}",
+            "        json:",
+            f"          name: user_{i}",
+            "          tags: [a, b, c]",
+            "          token: ${ env['TOKEN'] }",
+            "        expect:",
+            "          status_code: 200",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def measure(loader, content: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        Parser.parse_str(content, loader=loader)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    content = generate_profile(args.tasks)
+    print(f"profile: {len(content) / 1024 / 1024:.1f} MB, {args.tasks} tasks")
+
+    python = measure(PyAppLoader, content, args.repeat)
+    print(f"PyAppLoader: {python:.3f}s")
+
+    if CAppLoader is None:
+        print("CAppLoader: libyaml is not available")
+        return
+
+    c = measure(CAppLoader, content, args.repeat)
+    print(f"CAppLoader:  {c:.3f}s ({python / c:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
+__version__ = "0.0.1"
+
 from .types import undefined  # isort:skip
 from . import sandbox  # isort:skip
 from .parser import Parser  # isort:skip
+from .cassette import CassetteTransport
 from .sandbox import builtins
-from .transport import ASGITransportLifespan
+from .stub import StubTransport
+from .transport import ASGIProcessTransport, ASGITransportLifespan
 from .worker import HttpxJob
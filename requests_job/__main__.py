@@ -1,3 +1,6 @@
+import sys
+from contextlib import ExitStack
+
 import typer
 
 from .worker import HttpxJob
@@ -6,9 +9,68 @@ app = typer.Typer()
 
 
 @app.command()
-def run(path: str, extension: str = None):
-    job = HttpxJob.parse_file(path=path, extension=extension)
-    job.run()
+def run(
+    path: str,
+    concurrency: int = None,
+    parallel_jobs: int = None,
+    cache: bool = typer.Option(
+        False,
+        help="検証済みのプロファイルをキャッシュし、内容が変わっていなければ再利用します。プロファイルに記述した認証情報もキャッシュに保存されます。pickleできないフックなどを含む場合はキャッシュしません。",
+    ),
+    cache_dir: str = typer.Option(
+        None,
+        help="キャッシュのディレクトリです。キャッシュはpickleで読み込まれるため、自分だけが書き込めるディレクトリを指定してください。",
+    ),
+    feed: str = typer.Option(
+        None,
+        help="JSONLのリクエストフィードを、ジョブの設定で送信します。-は標準入力です。",
+    ),
+    output: str = typer.Option(
+        "-", help="フィードの結果を書き出すJSONLファイルです。-は標準出力です。"
+    ),
+    job_name: str = typer.Option(
+        None,
+        "--job",
+        help="フィードの送信に使うジョブです。省略した場合は最初のジョブです。",
+    ),
+    order: str = typer.Option(
+        "input", help="フィードの結果の順序です。input: 入力順, completion: 完了順"
+    ),
+    batch_size: int = typer.Option(
+        1000,
+        help="フィードを検証する行数の単位です。標準入力の行が途切れた場合は、それまでの行を先に送信します。",
+    ),
+    include_body: bool = typer.Option(
+        False, help="フィードの結果に、レスポンスの本文を含めます。"
+    ),
+):
+    if cache:
+        job = HttpxJob.parse_file_cached(path, cache_dir=cache_dir)
+    else:
+        job = HttpxJob.parse_file(path=path)
+
+    if feed is None:
+        job.run(concurrency=concurrency, parallel_jobs=parallel_jobs)
+        return
+
+    if order not in {"input", "completion"}:
+        raise typer.BadParameter(f"unknown order: {order}")
+
+    with ExitStack() as stack:
+        input = sys.stdin if feed == "-" else stack.enter_context(open(feed))
+        out = sys.stdout if output == "-" else stack.enter_context(open(output, "w"))
+        counts = job.run_feed(
+            input,
+            out,
+            job=job_name,
+            concurrency=concurrency,
+            ordered=order == "input",
+            batch_size=batch_size,
+            include_body=include_body,
+        )
+    typer.echo(f"{counts['total']} requests, {counts['errors']} errors", err=True)
+    if counts["errors"]:
+        raise typer.Exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+import warnings
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Dict, Iterator, Set, Tuple, Union
+
+from pydantic import BaseModel
+
+from .values import AttrPath
+
+Fingerprints = Dict[str, Union[Tuple[int, int], None]]
+
+
+def get_cache_dir() -> Path:
+    path = os.environ.get("REQUESTS_JOB_CACHE_DIR", None)
+    if path:
+        return Path(path)
+    return (
+        Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser() / "requests_job"
+    )
+
+
+def get_cache_key(content: bytes) -> str:
+    """プロファイルの内容、パッケージとPythonのバージョン、カレントディレクトリからキャッシュのキーを作成する。
+
+    相対パスのファイルはカレントディレクトリを基準に検証されるため、キーに含める。
+    """
+    from . import __version__
+
+    digest = hashlib.sha256(content)
+    digest.update(f"\0{__version__}\0{sys.version}\0{os.getcwd()}".encode())
+    return digest.hexdigest()
+
+
+def is_trusted(stat: os.stat_result) -> bool:
+    """自分が所有し、他のユーザーが書き込めないファイルかどうかを返す。POSIX以外では確認しない。"""
+    if not hasattr(os, "getuid"):
+        return True
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+def _iter_attr_paths(obj) -> Iterator[AttrPath]:
+    if isinstance(obj, AttrPath):
+        yield obj
+    elif isinstance(obj, BaseModel):
+        for value in obj.__dict__.values():
+            yield from _iter_attr_paths(value)
+    elif isinstance(obj, dict):
+        for value in obj.values():
+            yield from _iter_attr_paths(value)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for value in obj:
+            yield from _iter_attr_paths(value)
+
+
+def get_module_names(profile) -> Set[str]:
+    """プロファイルが参照しているフックやトランスポートなどのモジュール名を返す。"""
+    return {
+        AttrPath.split_module_attr(x.__root__)[0] for x in _iter_attr_paths(profile)
+    }
+
+
+def get_loaded_modules(module_names: Set[str]) -> Set[str]:
+    """module_namesに、同じトップレベルのパッケージに属する読み込み済みのモジュールを加えて返す。
+
+    フックのモジュールがimportしている、同じパッケージ内のモジュールの更新も検出するために用いる。
+    """
+    packages = {x.partition(".")[0] for x in module_names}
+    loaded = {x for x in list(sys.modules) if x.partition(".")[0] in packages}
+    return module_names | loaded
+
+
+def get_fingerprints(module_names: Set[str]) -> Fingerprints:
+    """モジュールのソースファイルの更新日時とサイズを返す。モジュールをimportせずに調べる。"""
+    fingerprints: Fingerprints = {}
+    for name in sorted(module_names):
+        try:
+            spec = find_spec(name)
+        except (ImportError, ValueError):
+            spec = None
+        origin = spec.origin if spec is not None else None
+        if origin and os.path.exists(origin):
+            stat = os.stat(origin)
+            fingerprints[name] = (stat.st_mtime_ns, stat.st_size)
+        else:
+            fingerprints[name] = None
+    return fingerprints
+
+
+class ProfileCache:
+    """検証と継承の解決を済ませたプロファイルを、ファイルの内容のハッシュをキーにpickleで保存する。
+
+    キャッシュが有効な場合は、YAMLの解析とpydanticの検証を行わずにプロファイルを復元する。
+    参照しているモジュールと同じパッケージのソースが更新された場合は、キャッシュを破棄して作り直す。
+
+    プロファイルはそのまま保存されるため、プロファイルに記述された認証情報（環境変数から展開した値を含む）もキャッシュに含まれる。
+    実行計画のauthのインスタンスは保存せず、復元時にプロファイルから作り直す。
+    pickleの読み込みは任意のコードを実行できるため、キャッシュのディレクトリは自分だけが書き込める場所にしてください。
+    ディレクトリは0700で作成し、他のユーザーが所有するファイルや、他のユーザーが書き込めるファイルは読み込まない。
+    """
+
+    def __init__(self, cache_dir: Union[str, Path, None] = None):
+        self.cache_dir = Path(cache_dir) if cache_dir else get_cache_dir()
+
+    def get_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pickle"
+
+    def load(self, key: str):
+        path = self.get_path(key)
+        try:
+            with open(path, "rb") as f:
+                if not is_trusted(os.fstat(f.fileno())):
+                    return None
+                # モジュールを確認してから、プロファイルを復元する
+                fingerprints = pickle.load(f)
+                if get_fingerprints(set(fingerprints)) != fingerprints:
+                    return None
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # 壊れたキャッシュや、互換性の無いキャッシュは無視する
+            return None
+
+    def save(self, key: str, profile) -> bool:
+        """プロファイルを保存する。pickleできない値（ラムダのフックなど）を含む場合は保存せずに偽を返す。"""
+        profile.get_plan()
+        fingerprints = get_fingerprints(get_loaded_modules(get_module_names(profile)))
+        self.cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(fingerprints, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(profile, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.get_path(key))
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            os.unlink(tmp)
+            warnings.warn(f"the profile is not cached: {e}", RuntimeWarning)
+            return False
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return True
+
+    def load_file(self, path: str, parse):
+        """pathのプロファイルを返す。キャッシュが無い場合はparseでプロファイルを作成して保存する。
+
+        保存できないプロファイルは、キャッシュせずにそのまま返す。
+        """
+        with open(path, "rb") as f:
+            content = f.read()
+
+        key = get_cache_key(content)
+        profile = self.load(key)
+        if profile is None:
+            profile = parse(content.decode())
+            self.save(key, profile)
+        return profile
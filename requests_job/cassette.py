@@ -0,0 +1,244 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import zlib
+from typing import Any, Dict, List, Literal, Optional, Tuple, Union
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+
+from .exceptions import CassetteNotFound
+
+CassetteMode = Literal["record", "replay", "auto"]
+
+
+def request_key(method: bytes, url: tuple, body: bytes) -> str:
+    """メソッド、URL、並べ替えたクエリパラメータ、本文のダイジェストからリクエストのキーを作成する。
+
+    ヘッダは認証情報や日時などリクエストごとに変わる値を含むため、キーに含めない。
+    """
+    scheme, host, port, target = url
+    path, _, query = target.partition(b"?")
+    params = sorted(parse_qsl(query.decode("latin-1"), keep_blank_values=True))
+    normalized = [
+        method.decode("ascii").upper(),
+        scheme.decode("ascii").lower(),
+        host.decode("ascii").lower(),
+        port,
+        path.decode("latin-1"),
+        urlencode(params),
+        hashlib.sha256(body).hexdigest(),
+    ]
+    return hashlib.sha256(json.dumps(normalized).encode()).hexdigest()
+
+
+def normalize_body(headers: List[Tuple[bytes, bytes]], body: bytes) -> bytes:
+    """マルチパートの本文の境界を固定の値に置き換える。
+
+    境界はリクエストごとにランダムに生成されるため、そのままでは記録したリクエストと一致しない。
+    """
+    for name, value in headers:
+        if name.lower() != b"content-type":
+            continue
+        media_type, _, params = value.partition(b";")
+        if not media_type.strip().lower().startswith(b"multipart/"):
+            return body
+        for param in params.split(b";"):
+            key, _, boundary = param.strip().partition(b"=")
+            boundary = boundary.strip(b'"')
+            if key.lower() == b"boundary" and boundary:
+                return body.replace(b"--" + boundary, b"--boundary")
+        return body
+    return body
+
+
+def format_url(url: tuple) -> str:
+    scheme, host, port, target = url
+    netloc = host if port is None else b"%s:%d" % (host, port)
+    return (b"%s://%s%s" % (scheme, netloc, target)).decode("latin-1")
+
+
+class CassetteStore:
+    """リクエストとレスポンスの組をsqliteに保存する。本文はzlibで圧縮する。"""
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS cassette (
+            key TEXT PRIMARY KEY,
+            method TEXT NOT NULL,
+            url TEXT NOT NULL,
+            status_code INTEGER NOT NULL,
+            headers TEXT NOT NULL,
+            extensions TEXT NOT NULL,
+            body BLOB NOT NULL
+        )
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection: Optional[sqlite3.Connection] = None
+
+    def open(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(self.schema)
+        connection.commit()
+        self.connection = connection
+
+    def close(self):
+        connection, self.connection = self.connection, None
+        if connection is not None:
+            connection.close()
+
+    def get(
+        self, key: str
+    ) -> Union[Tuple[int, List[Tuple[bytes, bytes]], Dict[str, Any], bytes], None]:
+        row = self.connection.execute(  # type: ignore
+            "SELECT status_code, headers, extensions, body FROM cassette WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        status_code, headers, extensions, body = row
+        headers = [
+            (k.encode("latin-1"), v.encode("latin-1")) for k, v in json.loads(headers)
+        ]
+        extensions = {k: v.encode("latin-1") for k, v in json.loads(extensions).items()}
+        return status_code, headers, extensions, zlib.decompress(body)
+
+    def put(
+        self,
+        key: str,
+        method: str,
+        url: str,
+        status_code: int,
+        headers: List[Tuple[bytes, bytes]],
+        extensions: Dict[str, Any],
+        body: bytes,
+    ):
+        headers_json = json.dumps(
+            [(k.decode("latin-1"), v.decode("latin-1")) for k, v in headers]
+        )
+        extensions_json = json.dumps(
+            {
+                k: v.decode("latin-1")
+                for k, v in extensions.items()
+                if isinstance(v, bytes)
+            }
+        )
+        self.connection.execute(  # type: ignore
+            "INSERT OR REPLACE INTO cassette VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                method,
+                url,
+                status_code,
+                headers_json,
+                extensions_json,
+                zlib.compress(body),
+            ),
+        )
+        self.connection.commit()  # type: ignore
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    """リクエストとレスポンスの組をカセット（sqlite）に記録し、再生するトランスポートです。
+
+    mode:
+        record: 常に送信し、レスポンスを記録します。
+        replay: 記録したレスポンスのみを返します。記録が無い場合はCassetteNotFoundとなります。
+        auto: 記録があれば再生し、無ければ送信して記録します。
+
+    transportには記録時に使うトランスポートをInstanceと同じ形式（type, args, kwargs）で指定します。
+    省略した場合は通常のネットワーク通信を行います。
+    記録と照合のため、リクエストとレスポンスの本文はメモリに読み込まれます。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: CassetteMode = "auto",
+        transport: Union[dict, httpx.AsyncBaseTransport, None] = None,
+    ):
+        if mode not in {"record", "replay", "auto"}:
+            raise ValueError(f"unknown mode: {mode}")
+
+        if isinstance(transport, dict):
+            from .values import Transport
+
+            transport = Transport(**transport).get_value()
+
+        self.mode = mode
+        self.store = CassetteStore(path)
+        self.transport = transport
+        self.is_opened = False
+        self.is_transport_entered = False
+        self.lock: Optional[asyncio.Lock] = None
+
+    async def __aenter__(self):
+        self.store.open()
+        self.is_opened = True
+        self.lock = asyncio.Lock()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.is_opened = False
+        try:
+            if self.is_transport_entered:
+                self.is_transport_entered = False
+                await self.transport.__aexit__(exc_type, exc, tb)  # type: ignore
+        finally:
+            self.store.close()
+
+    async def _get_transport(self) -> httpx.AsyncBaseTransport:
+        # 全て再生できる場合にアプリケーションなどを起動しないように、最初の送信時に開く
+        async with self.lock:
+            if not self.is_transport_entered:
+                if self.transport is None:
+                    self.transport = httpx.AsyncHTTPTransport()
+                await self.transport.__aenter__()
+                self.is_transport_entered = True
+        return self.transport  # type: ignore
+
+    async def handle_async_request(self, method, url, headers, stream, extensions):
+        if not self.is_opened:
+            raise RuntimeError("cassette is not opened.")
+
+        body = b"".join([x async for x in stream])
+        key = request_key(method, url, normalize_body(headers, body))
+
+        if self.mode != "record":
+            recorded = self.store.get(key)
+            if recorded is not None:
+                status_code, res_headers, res_extensions, res_body = recorded
+                return (
+                    status_code,
+                    res_headers,
+                    httpx.ByteStream(res_body),
+                    res_extensions,
+                )
+            if self.mode == "replay":
+                raise CassetteNotFound(method, url)
+
+        transport = await self._get_transport()
+        status_code, res_headers, res_stream, res_extensions = (
+            await transport.handle_async_request(
+                method, url, headers, httpx.ByteStream(body), extensions
+            )
+        )
+        try:
+            res_body = b"".join([x async for x in res_stream])
+        finally:
+            await res_stream.aclose()
+
+        self.store.put(
+            key,
+            method.decode("ascii"),
+            format_url(url),
+            status_code,
+            res_headers,
+            res_extensions,
+            res_body,
+        )
+        return status_code, res_headers, httpx.ByteStream(res_body), res_extensions
@@ -1,7 +1,240 @@
-from typing import Callable, Iterable
+import asyncio
+import atexit
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import AsyncExitStack
+from contextvars import ContextVar
+from inspect import isawaitable
+from typing import Callable, FrozenSet, Iterable, NamedTuple, Tuple, Union
 
 import httpx
 
+from . import spool
+from .multipart import MultipartStream
+
+
+class ProcessPool:
+    """processポリシーのフックを実行するプロセスプールです。
+
+    プロセスは最初のフックの実行時に起動し、close()で終了する。
+    """
+
+    def __init__(self):
+        self.executor: Union[ProcessPoolExecutor, None] = None
+
+    def get(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor()
+        return self.executor
+
+    def close(self):
+        executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+# 実行中のTransportRegistryが所有するプロセスプール
+_process_pool: ContextVar[Union[ProcessPool, None]] = ContextVar(
+    "process_pool", default=None
+)
+# レジストリの外で実行されたフックのプロセスプールは、インタプリタの終了時に閉じる
+_default_process_pool = ProcessPool()
+atexit.register(_default_process_pool.close)
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    return (_process_pool.get() or _default_process_pool).get()
+
+
+def wrap_hook(func: Callable, policy: str = "inline") -> Callable:
+    """フックを実行ポリシーに従って呼び出す関数に変換する。
+
+    - inline: イベントループ上でそのまま呼び出す
+    - thread: スレッドプールで実行し、イベントループを止めない
+    - process: プロセスプールで実行する。フックと引数はpickle可能でなければならない
+    """
+    if policy == "inline":
+        return func
+    elif policy not in {"thread", "process"}:
+        raise ValueError(f"unknown policy: {policy}")
+
+    return PolicyHook(func, policy)
+
+
+class PolicyHook:
+    """スレッドプールまたはプロセスプールでフックを実行する。実行計画と共にpickleできるようにクラスで定義する。"""
+
+    def __init__(self, func: Callable, policy: str):
+        self.func = func
+        self.policy = policy
+
+    async def __call__(self, arg):
+        executor = _get_process_pool() if self.policy == "process" else None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.func, arg)
+
+    def __repr__(self):
+        return f"PolicyHook({self.func!r}, {self.policy!r})"
+
+
+def _freeze(value):
+    """設定値をキャッシュのキーとして使えるようにハッシュ可能な値に変換する。"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(_freeze(x) for x in value)
+    elif isinstance(value, httpx.Limits):
+        return (
+            value.max_connections,
+            value.max_keepalive_connections,
+            value.keepalive_expiry,
+        )
+    else:
+        return value
+
+
+class SharedTransport(httpx.AsyncBaseTransport):
+    """TransportRegistryが所有するトランスポートを、クライアントが閉じないようにする。"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, *args, **kwargs):
+        return await self.transport.handle_async_request(*args, **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type=None, exc=None, tb=None):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+class TransportRegistry:
+    """接続設定が同じクライアント間で、コネクションプールとSSLコンテキストを共有する。
+
+    SSLコンテキストはverify, cert, trust_envの組み合わせごとに一度だけ作成される。
+    processポリシーのフックを実行するプロセスプールも、レジストリの中で共有される。
+    トランスポートとプロセスプールはレジストリの終了時に閉じられる。
+    """
+
+    def __init__(self):
+        self.ssl_contexts: dict = {}
+        self.transports: dict = {}
+        self.lock = asyncio.Lock()
+        self.stack = AsyncExitStack()
+        self.process_pool = ProcessPool()
+
+    async def __aenter__(self):
+        await self.stack.__aenter__()
+        token = _process_pool.set(self.process_pool)
+        self.stack.callback(self.process_pool.close)
+        self.stack.callback(_process_pool.reset, token)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.transports = {}
+        return await self.stack.__aexit__(exc_type, exc, tb)
+
+    def get_ssl_context(self, verify=True, cert=None, trust_env: bool = True):
+        key = _freeze((verify, cert, trust_env))
+        context = self.ssl_contexts.get(key, None)
+        if context is None:
+            context = httpx.create_ssl_context(
+                verify=verify, cert=cert, trust_env=trust_env
+            )
+            self.ssl_contexts[key] = context
+        return context
+
+    async def acquire(
+        self,
+        verify=True,
+        cert=None,
+        http1: bool = True,
+        http2: bool = False,
+        limits: httpx.Limits = httpx.Limits(
+            max_connections=100, max_keepalive_connections=20
+        ),
+        proxies=None,
+        trust_env: bool = True,
+    ) -> dict:
+        """設定に対応する共有トランスポートを、AsyncClientの引数（transport, mounts）として返す。"""
+        key = _freeze((verify, cert, http1, http2, limits, proxies, trust_env))
+        async with self.lock:
+            shared = self.transports.get(key, None)
+            if shared is None:
+                ssl_context = self.get_ssl_context(verify, cert, trust_env)
+                kwargs = dict(
+                    verify=ssl_context, http1=http1, http2=http2, limits=limits
+                )
+                transport = await self._open(
+                    httpx.AsyncHTTPTransport(trust_env=trust_env, **kwargs)
+                )
+                mounts = {}
+                for pattern, proxy in self._get_proxy_map(proxies, trust_env).items():
+                    if proxy is None:
+                        mounts[pattern] = None
+                    else:
+                        mounts[pattern] = await self._open(
+                            httpx.AsyncHTTPTransport(
+                                trust_env=trust_env, proxy=proxy, **kwargs
+                            )
+                        )
+                shared = {"transport": transport, "mounts": mounts}
+                self.transports[key] = shared
+
+        return shared
+
+    async def _open(self, transport: httpx.AsyncBaseTransport):
+        await self.stack.enter_async_context(transport)
+        return SharedTransport(transport)
+
+    @staticmethod
+    def _get_proxy_map(proxies, trust_env: bool) -> dict:
+        # httpx.AsyncClientと同じ規則でプロキシを解決する
+        if proxies is None:
+            if not trust_env:
+                return {}
+            from httpx._utils import get_environment_proxies
+
+            proxies = get_environment_proxies()
+        elif not isinstance(proxies, dict):
+            proxies = {"all://": proxies}
+
+        return {
+            str(k): (
+                None
+                if v is None
+                else v if isinstance(v, httpx.Proxy) else httpx.Proxy(url=v)
+            )
+            for k, v in proxies.items()
+        }
+
+
+class HookPipeline(NamedTuple):
+    """イベントごとのフックを保持する不変のパイプライン。
+
+    タスクごとに一度だけ構築し、リクエストごとには関数を呼び出すだけにする。
+    """
+
+    build_request: Tuple[Callable, ...] = ()
+    request: Tuple[Callable, ...] = ()
+    response: Tuple[Callable, ...] = ()
+    expect: Tuple[Callable, ...] = ()
+    success: Tuple[Callable, ...] = ()
+    error: Tuple[Callable, ...] = ()
+    complete: Tuple[Callable, ...] = ()
+    exception: Tuple[Callable, ...] = ()
+    concurrent: FrozenSet[str] = frozenset()
+
+    @classmethod
+    def from_dict(cls, event_hooks: Union[dict, None]) -> "HookPipeline":
+        event_hooks = dict(event_hooks or {})
+        concurrent = frozenset(event_hooks.pop("concurrent", None) or ())
+        hooks = {k: tuple(v) for k, v in event_hooks.items()}
+        return cls(**hooks, concurrent=concurrent)
+
 
 class AsyncClientWrapper:
     events = {
@@ -15,10 +248,21 @@ class AsyncClientWrapper:
         "exception",
     }
 
-    def __init__(self, **kwargs):
-        # dryrun
-        httpx.AsyncClient(**kwargs)
+    transport_fields = {
+        "verify",
+        "cert",
+        "http1",
+        "http2",
+        "limits",
+        "proxies",
+        "trust_env",
+    }
+
+    def __init__(self, registry: TransportRegistry = None, **kwargs):
+        self.registry = registry
         self.kwargs = kwargs
+        self.client: httpx.AsyncClient = None  # type: ignore
+        self.stack: AsyncExitStack = None  # type: ignore
 
     @staticmethod
     def _build_args(kwargs):
@@ -26,85 +270,159 @@ class AsyncClientWrapper:
         send_args = {}
 
         for k, v in kwargs.items():
-            if k in {"allow_redirects", "timeout", "stream", "auth"}:
+            if k in {"allow_redirects", "timeout", "stream", "auth", "spool_threshold"}:
                 send_args[k] = v
             else:
                 request_args[k] = v
 
         return request_args, send_args
 
-    async def request(self, event_hooks={}, **kwargs):
+    async def request(self, event_hooks: Union[HookPipeline, dict] = {}, **kwargs):
         if self.client is None:
             raise RuntimeError("Client not created.use async with")
-        event_hooks = self._build_event_hooks(event_hooks)
+        if not isinstance(event_hooks, HookPipeline):
+            event_hooks = HookPipeline.from_dict(event_hooks)
 
         request_args, send_args = self._build_args(kwargs)
+        spool_threshold = send_args.pop("spool_threshold", None)
+        if spool_threshold is not None and not send_args.get("stream", False):
+            send_args["stream"] = True
+        else:
+            spool_threshold = None
+
+        content = request_args.get("content", None)
+        if isinstance(content, MultipartStream):
+            # URLのファイルは、ジョブのクライアントの設定と共有のトランスポートでダウンロードする
+            content.bind(self.client)
+        try:
+            request = self.client.build_request(**request_args)
+            request = await self.on_build_request(request, event_hooks.build_request)
+            errors = await self.on_request(request, event_hooks.request)
+            response = await self.client.send(request, **send_args)
+        finally:
+            # 送信が中断された場合でも、ストリームが開いたファイルを閉じる
+            if hasattr(content, "aclose"):
+                await content.aclose()
 
-        request = self.client.build_request(**request_args)
-        request = self.on_build_request(request, event_hooks["build_request"])
-        errors = self.on_request(request, event_hooks["request"])
-
-        response = await self.client.send(request, **send_args)
-        errors = self.on_response(response, event_hooks["response"])
-        errors = self.on_expect(response, event_hooks["expect"])
-        errors = await self.on_success(response, event_hooks["success"])
-        errors = await self.on_error(response, event_hooks["error"])
-        errors = await self.on_complete(response, event_hooks["complete"])
-        errors = await self.on_exception(errors, event_hooks["exception"])
+        body = None
+        try:
+            if spool_threshold is not None:
+                # 読み込んだ本文はレスポンスが破棄されるまで保持する
+                body = await spool.read_response(response, spool_threshold)
+            await self._on_received(response, event_hooks)
+        except BaseException:
+            if body is not None:
+                body.close()
+            raise
+        finally:
+            if send_args.get("stream", False):
+                await response.aclose()
         return response
 
+    async def _on_received(self, response, event_hooks: HookPipeline):
+        errors = await self.on_response(response, event_hooks.response)
+        errors = await self.on_expect(response, event_hooks.expect)
+        concurrent = event_hooks.concurrent
+        errors = await self.on_success(
+            response, event_hooks.success, "success" in concurrent
+        )
+        errors = await self.on_error(response, event_hooks.error, "error" in concurrent)
+        errors = await self.on_complete(
+            response, event_hooks.complete, "complete" in concurrent
+        )
+        errors = await self.on_exception(
+            errors, event_hooks.exception, "exception" in concurrent
+        )
+
     async def __aenter__(self):
-        self.client = httpx.AsyncClient(**self.kwargs)
-        await self.client.__aenter__()
+        stack = AsyncExitStack()
+        await stack.__aenter__()
+        try:
+            kwargs = await self._build_client_args(stack)
+            self.client = await stack.enter_async_context(httpx.AsyncClient(**kwargs))
+        except BaseException as e:
+            await stack.__aexit__(type(e), e, e.__traceback__)
+            raise
+        self.stack = stack
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
-        client = self.client
-        self.client = None
-        return await client.__aexit__(exc_type, exc, tb)
+        stack = self.stack
+        self.client = None  # type: ignore
+        self.stack = None  # type: ignore
+        return await stack.__aexit__(exc_type, exc, tb)
+
+    async def _build_client_args(self, stack: AsyncExitStack) -> dict:
+        kwargs = dict(self.kwargs)
+        if kwargs.get("transport", None) is not None or kwargs.get("app", None):
+            return kwargs
+
+        registry = self.registry
+        if registry is None:
+            registry = await stack.enter_async_context(TransportRegistry())
+
+        transport_args = {
+            k: kwargs.pop(k) for k in self.transport_fields if k in kwargs
+        }
+        if "trust_env" in transport_args:
+            kwargs["trust_env"] = transport_args["trust_env"]
+        kwargs.update(await registry.acquire(**transport_args))
+        return kwargs
+
+    @staticmethod
+    async def _call(func: Callable, arg):
+        result = func(arg)
+        if isawaitable(result):
+            result = await result
+        return result
 
     @classmethod
-    def _build_event_hooks(cls, event_hooks: dict):
-        base_event_hooks = {k: [] for k in cls.events}  # type: ignore
-        event_hooks = event_hooks or {}
-        base_event_hooks.update(event_hooks)
-        return base_event_hooks
+    async def _dispatch(cls, arg, events: Iterable[Callable], concurrent: bool):
+        if concurrent:
+            await asyncio.gather(*(cls._call(func, arg) for func in events))
+        else:
+            for func in events:
+                await cls._call(func, arg)
 
-    def on_build_request(self, request, events: Iterable[Callable]):
+    async def on_build_request(self, request, events: Iterable[Callable]):
         for func in events:
-            request = func(request)
+            request = await self._call(func, request)
         return request
 
-    def on_request(self, request, events: Iterable[Callable]):
+    async def on_request(self, request, events: Iterable[Callable]):
         for func in events:
-            func(request)
+            await self._call(func, request)
 
-    def on_response(self, response, events: Iterable[Callable]):
+    async def on_response(self, response, events: Iterable[Callable]):
         for func in events:
-            func(response)
+            await self._call(func, response)
 
-    def on_expect(self, response, events: Iterable[Callable]):
+    async def on_expect(self, response, events: Iterable[Callable]):
         for func in events:
-            func(response)
+            await self._call(func, response)
 
-    async def on_success(self, response, events: Iterable[Callable]):
-        for func in events:
-            await func(response)
+    async def on_success(
+        self, response, events: Iterable[Callable], concurrent: bool = False
+    ):
+        await self._dispatch(response, events, concurrent)
 
-    async def on_error(self, response, events: Iterable[Callable]):
-        for func in events:
-            await func(response)
+    async def on_error(
+        self, response, events: Iterable[Callable], concurrent: bool = False
+    ):
+        await self._dispatch(response, events, concurrent)
 
-    async def on_complete(self, response, events: Iterable[Callable]):
-        for func in events:
-            await func(response)
+    async def on_complete(
+        self, response, events: Iterable[Callable], concurrent: bool = False
+    ):
+        await self._dispatch(response, events, concurrent)
 
-    async def on_exception(self, errors, events: Iterable[Callable]):
+    async def on_exception(
+        self, errors, events: Iterable[Callable], concurrent: bool = False
+    ):
         """
         イベント実行時に想定外のエラーが発生した場合に実行される
         """
         if not errors:
             return
 
-        for func in events:
-            await func(errors)
+        await self._dispatch(errors, events, concurrent)
@@ -0,0 +1,62 @@
+import csv
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Literal, Union
+
+DataFormat = Literal["csv", "jsonl"]
+
+SUFFIXES: Dict[str, DataFormat] = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+}
+
+
+def guess_format(path: Union[str, Path]) -> Union[DataFormat, None]:
+    return SUFFIXES.get(Path(path).suffix.lower(), None)
+
+
+def iter_rows(
+    path: Union[str, Path], format: DataFormat = None
+) -> Iterator[Dict[str, Any]]:
+    """データソースを一行ずつ読み込み、辞書として返す。
+
+    ファイル全体をメモリに読み込まないため、巨大なファイルでもメモリの使用量は一定です。
+    csvはヘッダ行を列名とし、値は全て文字列になる。jsonlは一行に一つのオブジェクトを記述する。
+    """
+    format = format or guess_format(path)
+    if format == "csv":
+        yield from _iter_csv(path)
+    elif format == "jsonl":
+        yield from _iter_jsonl(path)
+    else:
+        raise ValueError(f"unknown data format: {path}")
+
+
+def get_columns(
+    path: Union[str, Path], format: DataFormat = None
+) -> Union[List[str], None]:
+    """列名を返す。csvはヘッダ行、jsonlは最初の行のキーです。行が無い場合はNoneを返す。"""
+    format = format or guess_format(path)
+    if format == "csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            return next(csv.reader(f), None)
+    for row in iter_rows(path, format):
+        return list(row)
+    return None
+
+
+def _iter_csv(path) -> Iterator[Dict[str, Any]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def _iter_jsonl(path) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError(f"{path}:{lineno}: a row must be an object.")
+            yield row
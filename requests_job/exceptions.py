@@ -5,6 +5,40 @@ class AppException(Exception):
     pass
 
 
+class JobError(AppException):
+    def __init__(self, results):
+        self.results = results
+        failed = [x.name for x in results if x.exception is not None]
+        super().__init__(f"failed jobs: {failed}")
+
+
+class CassetteNotFound(AppException):
+    def __init__(self, method: bytes, url: tuple):
+        from .cassette import format_url
+
+        super().__init__(f"no recorded response: {method.decode()} {format_url(url)}")
+
+
+class ExpectationError(AppException):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(f"{x.__class__.__name__}: {x}" for x in errors))
+
+
+class InvalidRowError(AppException):
+    def __init__(self, task: str, index: int, error: Exception):
+        self.task = task
+        self.index = index
+        self.error = error
+        super().__init__(f"{task!r} row {index}: {error.__class__.__name__}: {error}")
+
+
+class ParametrizeError(AppException):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} invalid rows: {errors[0]}")
+
+
 class DuplicateKeyError(KeyError):
     def __init__(self, keys):
         super().__init__(keys)
@@ -0,0 +1,228 @@
+import asyncio
+import json
+import os
+import select
+import stat
+import time
+from typing import (
+    IO,
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Union,
+)
+
+from pydantic import Field, ValidationError, validator
+
+from . import scheduler
+from .client import AsyncClientWrapper, HookPipeline, TransportRegistry
+from .exceptions import ExpectationError
+from .schemas import Job, Task
+from .verifier import StreamVerifier, Verifier
+
+
+class FeedVerifier(Verifier):
+    """期待値と一致しない場合に、出力せずに例外を送出する。例外は結果の行のerrorに書き出される。"""
+
+    def report(self, errors: List[Exception]):
+        if errors:
+            raise ExpectationError(errors)
+
+
+class FeedStreamVerifier(StreamVerifier):
+    report = FeedVerifier.report
+
+
+class FeedRequest(Task):
+    """リクエストフィードの一行です。ジョブの設定を継承して送信されます。"""
+
+    __verifier__ = FeedVerifier
+    __stream_verifier__ = FeedStreamVerifier
+
+    id: Any = Field(None, description="結果の行にそのまま出力されます。")
+
+    @validator("depends_on")
+    def no_dependencies(cls, v):
+        if v:
+            raise ValueError("depends_on is not supported in a feed.")
+        return v
+
+    @validator("parametrize")
+    def no_parametrize(cls, v):
+        if v is not None:
+            raise ValueError("parametrize is not supported in a feed.")
+        return v
+
+
+class FeedError:
+    """検証できなかった行です。送信せずに、エラーとして結果に出力されます。"""
+
+    __slots__ = ("id", "error")
+
+    def __init__(self, error: str, id: Any = None):
+        self.id = id
+        self.error = error
+
+
+FeedItem = Union[FeedRequest, FeedError]
+
+
+def parse_line(line: str) -> FeedItem:
+    try:
+        obj = json.loads(line)
+    except ValueError as e:
+        return FeedError(f"invalid json: {e}")
+
+    if not isinstance(obj, dict):
+        return FeedError("a line must be an object.")
+
+    try:
+        return FeedRequest.parse_obj(obj)
+    except ValidationError as e:
+        return FeedError(str(e), obj.get("id", None))
+
+
+def _get_poll(file: IO[str]) -> Union[Callable[[], bool], None]:
+    """パイプや端末のように行が少しずつ届く入力について、次の入力が届いているかを返す関数を返す。
+
+    通常のファイルや、判定できない入力ではNoneを返す。
+    """
+    try:
+        fd = file.fileno()
+        if stat.S_ISREG(os.fstat(fd).st_mode):
+            return None
+    except (AttributeError, OSError, ValueError):
+        return None
+
+    def poll() -> bool:
+        try:
+            return bool(select.select([fd], [], [], 0)[0])
+        except (OSError, ValueError):
+            return True
+
+    return poll
+
+
+def _iter_batches(file: IO[str], batch_size: int) -> Iterator[List[FeedItem]]:
+    """最大batch_size行ずつ検証して返す。
+
+    パイプや端末からの入力は、次の行がまだ届いていなければbatch_sizeに満たなくても返す。
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be greater than 0: {batch_size}")
+
+    poll = _get_poll(file)
+    batch: List[FeedItem] = []
+    for line in file:
+        if line.strip():
+            batch.append(parse_line(line))
+        if len(batch) >= batch_size or (batch and poll is not None and not poll()):
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_feed(file: IO[str], batch_size: int = 1000) -> Iterator[FeedItem]:
+    """ファイルからbatch_size行ずつ読み込んで検証し、一行ずつ返す。
+
+    次の行が必要になるまで読み込みを進めないため、メモリに保持する行はbatch_size行までです。
+    空行は無視する。
+    """
+    for batch in _iter_batches(file, batch_size):
+        yield from batch
+
+
+async def aread_feed(file: IO[str], batch_size: int = 1000) -> AsyncIterator[FeedItem]:
+    """read_feedと同じ行を返す。読み込みと検証はスレッドで行うため、イベントループを止めない。
+
+    標準入力のように次の行がすぐに届かない入力でも、送信中のリクエストは待たされない。
+    """
+    loop = asyncio.get_running_loop()
+    batches = _iter_batches(file, batch_size)
+    while True:
+        batch = await loop.run_in_executor(None, next, batches, None)
+        if batch is None:
+            return
+        for item in batch:
+            yield item
+
+
+def dump_result(result: Dict[str, Any]) -> str:
+    return json.dumps(result, ensure_ascii=False, default=str) + "\n"
+
+
+async def run_feed(
+    job: Job,
+    items: Union[Iterable[FeedItem], AsyncIterable[FeedItem]],
+    callback: Callable[[Dict[str, Any]], Any],
+    token,
+    concurrency: int = None,
+    ordered: bool = True,
+    include_body: bool = False,
+    registry: TransportRegistry = None,
+):
+    """フィードのリクエストを、jobのクライアントで最大concurrency個まで並行して送信する。
+
+    結果は辞書としてcallbackに渡される。orderedが真の場合は入力順に、偽の場合は完了順に渡す。
+    入力順に並べ替えるために保留する結果は、concurrency * 4件までです。
+    上限に達した場合は、先頭のリクエストが完了するまで新しい行を読み込まない。
+    送信や検証に失敗した行も、errorを持つ結果として出力される。
+    itemsには、read_feedまたはaread_feedの結果を渡す。
+    """
+    client_args = job.build_client_args()
+    client_args.pop("event_hooks", None)
+    concurrency = concurrency or job.concurrency
+
+    # フックと期待値を持たない行は、ジョブのフックを共有する
+    default_pipeline = FeedRequest().merge_parent(job).compile_hooks()
+    pipeline_fields = {"event_hooks", "expect", "stream"}
+
+    async with AsyncClientWrapper(registry, **client_args) as client:
+
+        async def send(indexed) -> Dict[str, Any]:
+            index, item = indexed
+            result: Dict[str, Any] = {"index": index, "id": item.id}
+            if isinstance(item, FeedError):
+                result["error"] = item.error
+                return result
+
+            started = time.perf_counter()
+            try:
+                task = item.merge_parent(job)
+                if pipeline_fields & item.__fields_set__:
+                    pipeline: HookPipeline = task.compile_hooks()
+                else:
+                    pipeline = default_pipeline
+                args = task.build_request_args(include_event_hooks=False)
+                response = await client.request(pipeline, **args)
+            except Exception as e:
+                result["elapsed"] = time.perf_counter() - started
+                result["error"] = f"{type(e).__name__}: {e}"
+                return result
+
+            result["elapsed"] = time.perf_counter() - started
+            result["status_code"] = response.status_code
+            if include_body and not task.stream:
+                result["body"] = response.text
+            return result
+
+        if isinstance(items, AsyncIterable):
+            indexed: Any = scheduler.aenumerate(items)
+        else:
+            indexed = enumerate(items)
+
+        await scheduler.bounded_map(
+            send,
+            indexed,
+            concurrency,
+            token,
+            callback=callback,
+            ordered=ordered,
+            max_pending=concurrency * 4,
+        )
@@ -0,0 +1,187 @@
+import asyncio
+import itertools
+import math
+import time
+from array import array
+from typing import Any, Awaitable, Callable, Iterable, Iterator, List, Sequence, Tuple
+
+
+class LoadStats:
+    """負荷試験の結果を集計する。リクエストは送信した時刻が属するステージに計上される。"""
+
+    percentiles = (50, 90, 95, 99)
+
+    def __init__(self, name: str = "", duration: float = 0.0):
+        self.name = name
+        self.duration = duration
+        self.sent = 0
+        self.completed = 0
+        self.errors = 0
+        self.dropped = 0
+        self.latencies = array("d")
+
+    @classmethod
+    def combine(cls, name: str, stats: Iterable["LoadStats"]) -> "LoadStats":
+        result = cls(name)
+        for x in stats:
+            result.duration += x.duration
+            result.sent += x.sent
+            result.completed += x.completed
+            result.errors += x.errors
+            result.dropped += x.dropped
+            result.latencies.extend(x.latencies)
+        return result
+
+    def record(self, latency: float, is_error: bool):
+        self.completed += 1
+        self.latencies.append(latency)
+        if is_error:
+            self.errors += 1
+
+    @property
+    def throughput(self) -> float:
+        return self.completed / self.duration if self.duration else 0.0
+
+    def percentile(self, p: float) -> float:
+        """nearest-rank法でレイテンシのパーセンタイル（秒）を返す。"""
+        if not self.latencies:
+            return 0.0
+        return self._percentile(sorted(self.latencies), p)
+
+    @staticmethod
+    def _percentile(ordered: Sequence[float], p: float) -> float:
+        rank = max(int(len(ordered) * p / 100 + 0.5), 1)
+        return ordered[min(rank, len(ordered)) - 1]
+
+    def summary(self) -> dict:
+        result = {
+            "name": self.name,
+            "sent": self.sent,
+            "completed": self.completed,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "duration": round(self.duration, 3),
+            "throughput": round(self.throughput, 3),
+        }
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            for p in self.percentiles:
+                result[f"p{p}"] = round(self._percentile(ordered, p), 6)
+            result["max"] = round(ordered[-1], 6)
+        return result
+
+    def __str__(self):
+        return " ".join(f"{k}={v}" for k, v in self.summary().items())
+
+
+def ramp_arrivals(
+    start_rate: float, end_rate: float, duration: float
+) -> Iterator[float]:
+    """到着率をstart_rateからend_rateへ線形に変化させた場合の、各リクエストの送信時刻（開始からの秒数）を返す。
+
+    n番目の送信時刻は、累積到着数 start_rate * t + slope * t^2 / 2 = n の解として求める。
+    """
+    total = (start_rate + end_rate) * duration / 2
+    slope = (end_rate - start_rate) / duration
+    for n in itertools.count():
+        if n >= total:
+            return
+        if slope:
+            offset = (math.sqrt(start_rate**2 + 2 * slope * n) - start_rate) / slope
+        else:
+            offset = n / start_rate
+        if offset >= duration:
+            return
+        yield offset
+
+
+def constant_arrivals(rate: float, duration: float) -> Iterator[float]:
+    """一定の到着率で、各リクエストの送信時刻（開始からの秒数）を返す。"""
+    return ramp_arrivals(rate, rate, duration)
+
+
+async def run_stages(
+    send: Callable[[Any], Awaitable],
+    requests: Iterable,
+    stages: Sequence,
+    max_outstanding: int,
+    token,
+) -> List[LoadStats]:
+    """start, target, durationを持つステージを順番に実行し、ステージごとの集計結果を返す。"""
+    results = [LoadStats(x.name, x.duration) for x in stages]
+
+    def arrivals():
+        begin = 0.0
+        for stage, stats in zip(stages, results):
+            for offset in ramp_arrivals(stage.start, stage.target, stage.duration):
+                yield begin + offset, stats
+            begin += stage.duration
+
+    await generate_load(send, requests, arrivals(), max_outstanding, token)
+    return results
+
+
+def repeat(iterable: Iterable) -> Iterator:
+    """iterableを繰り返し返す。
+
+    itertools.cycleと異なり要素を保持せず、一巡するたびにiterableを反復し直す。
+    展開したタスクのように、全ての要素をメモリに保持できない場合に用いる。
+    """
+    while True:
+        empty = True
+        for x in iterable:
+            empty = False
+            yield x
+        if empty:
+            raise ValueError("requests is empty.")
+
+
+async def generate_load(
+    send: Callable[[Any], Awaitable],
+    requests: Iterable,
+    arrivals: Iterable[Tuple[float, LoadStats]],
+    max_outstanding: int,
+    token,
+):
+    """arrivalsが示す時刻にrequestsを順番に送信し、組になっているLoadStatsに計上する（オープンモデル）。
+
+    応答を待たずに次のリクエストを送信する。応答待ちのリクエストがmax_outstandingに達している場合、
+    その時刻のリクエストは送信せずにdroppedとして計上する。
+    """
+    if not requests:
+        raise ValueError("requests is empty.")
+
+    loop = asyncio.get_running_loop()
+    outstanding: set = set()
+    cycle = repeat(requests)
+
+    async def fire(request, stats: LoadStats):
+        started = time.perf_counter()
+        try:
+            response = await send(request)
+            is_error = getattr(response, "is_error", False)
+        except Exception:
+            is_error = True
+        stats.record(time.perf_counter() - started, is_error)
+
+    start = loop.time()
+    try:
+        for offset, stats in arrivals:
+            if token.is_cancelled:
+                break
+
+            await asyncio.sleep(max(start + offset - loop.time(), 0))
+            request = next(cycle)
+            if len(outstanding) >= max_outstanding:
+                stats.dropped += 1
+                continue
+
+            stats.sent += 1
+            task = asyncio.ensure_future(fire(request, stats))
+            outstanding.add(task)
+            task.add_done_callback(outstanding.discard)
+
+        await asyncio.gather(*outstanding)
+    finally:
+        for task in outstanding:
+            task.cancel()
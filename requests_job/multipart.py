@@ -0,0 +1,213 @@
+import asyncio
+import binascii
+import mimetypes
+import os
+from pathlib import Path, PurePosixPath
+from typing import Any, AsyncIterator, Dict, List, Sequence, Union
+
+import httpx
+
+
+def _format_param(name: str, value: str) -> bytes:
+    # httpxと同じく、引用符とバックスラッシュをエスケープする
+    value = value.replace("\\", "\\\\").replace('"', "%22")
+    return f'{name}="{value}"'.encode()
+
+
+class DataPart:
+    """マルチパートフォームのデータフィールドです。"""
+
+    def __init__(self, name: str, value: Any):
+        self.name = name
+        self.value = value if isinstance(value, bytes) else str(value).encode()
+
+    def render_headers(self) -> bytes:
+        return (
+            b"Content-Disposition: form-data; "
+            + _format_param("name", self.name)
+            + b"\r\n\r\n"
+        )
+
+    def get_size(self) -> Union[int, None]:
+        return len(self.value)
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        yield self.value
+
+
+class FilePart:
+    """マルチパートフォームのファイルフィールドです。
+
+    ファイルは送信する時点で開き、スレッドプールでchunk_sizeずつ読み込む。
+    読み込みが終わるか、中断された時点でファイルを閉じる。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: Union[str, Path],
+        filename: str = None,
+        media_type: str = None,
+        chunk_size: int = 65536,
+    ):
+        self.name = name
+        self.path = Path(path)
+        self.filename = self.path.name if filename is None else filename
+        self.media_type = (
+            media_type
+            or mimetypes.guess_type(self.filename)[0]
+            or "application/octet-stream"
+        )
+        self.chunk_size = chunk_size
+
+    def render_headers(self) -> bytes:
+        return (
+            b"Content-Disposition: form-data; "
+            + _format_param("name", self.name)
+            + b"; "
+            + _format_param("filename", self.filename)
+            + f"\r\nContent-Type: {self.media_type}\r\n\r\n".encode()
+        )
+
+    def get_size(self) -> Union[int, None]:
+        return os.path.getsize(self.path)
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        file = await loop.run_in_executor(None, open, self.path, "rb")
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, file.read, self.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            file.close()
+
+
+class UrlPart:
+    """URLからダウンロードしながら送信する、マルチパートフォームのファイルフィールドです。
+
+    ダウンロードしたチャンクは一時ファイルを介さずにそのまま送信される。
+    送信側が次のチャンクを要求するまで受信を進めないため、両者の速度差はバッファされない。
+    サイズが分からないため、本文はチャンク転送で送信される。
+    transportを指定しない場合は、bind()されたジョブのクライアントの設定（verify, proxies, headersなど）と
+    共有のコネクションプールでダウンロードする。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        filename: str = None,
+        media_type: str = None,
+        transport: httpx.AsyncBaseTransport = None,
+    ):
+        self.name = name
+        self.url = str(url)
+        self.filename = (
+            PurePosixPath(httpx.URL(self.url).path).name or "file"
+            if filename is None
+            else filename
+        )
+        self.media_type = (
+            media_type
+            or mimetypes.guess_type(self.filename)[0]
+            or "application/octet-stream"
+        )
+        self.transport = transport
+        self.client: Union[httpx.AsyncClient, None] = None
+
+    render_headers = FilePart.render_headers
+
+    def get_size(self) -> Union[int, None]:
+        return None
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        if self.transport is None and self.client is not None:
+            async for chunk in self._download(self.client):
+                yield chunk
+            return
+
+        async with httpx.AsyncClient(transport=self.transport) as client:
+            async for chunk in self._download(client):
+                yield chunk
+
+    async def _download(self, client: httpx.AsyncClient) -> AsyncIterator[bytes]:
+        async with client.stream("GET", self.url) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                yield chunk
+
+
+class MultipartStream:
+    """ファイルをメモリに読み込まずに、マルチパートフォームの本文を非同期に生成する。
+
+    httpxのcontentとして渡し、get_headers()の値をリクエストヘッダに加える。
+    全てのパートのサイズが分かる場合はContent-Lengthを、分からない場合はチャンク転送を用いる。
+    送信が中断された場合に備えて、送信後はaclose()で開いているファイルを閉じる。
+    """
+
+    def __init__(
+        self,
+        data: Union[Dict[str, Any], None] = None,
+        files: Sequence = (),
+        boundary: bytes = None,
+    ):
+        parts: List[Any] = []
+        for name, value in (data or {}).items():
+            values = value if isinstance(value, (list, tuple)) else [value]
+            parts.extend(DataPart(name, x) for x in values)
+        parts.extend(files)
+        self.parts = parts
+        self.boundary = boundary or binascii.hexlify(os.urandom(16))
+        self.iterators: List[Any] = []
+
+    def bind(self, client: httpx.AsyncClient):
+        """transportを指定していないURLのパートを、clientでダウンロードするようにする。"""
+        for part in self.parts:
+            if isinstance(part, UrlPart):
+                part.client = client
+
+    def get_content_length(self) -> Union[int, None]:
+        boundary_size = len(self.boundary)
+        # --boundary\r\n + headers + body + \r\n
+        length = 0
+        for part in self.parts:
+            size = part.get_size()
+            if size is None:
+                return None
+            length += 2 + boundary_size + 2 + len(part.render_headers()) + size + 2
+        # --boundary--\r\n
+        return length + 2 + boundary_size + 4
+
+    def get_headers(self) -> Dict[str, str]:
+        boundary = self.boundary.decode("ascii")
+        headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+        length = self.get_content_length()
+        if length is not None:
+            headers["Content-Length"] = str(length)
+        return headers
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        iterator = self._iter_chunks()
+        self.iterators.append(iterator)
+        return iterator
+
+    async def _iter_chunks(self) -> AsyncIterator[bytes]:
+        for part in self.parts:
+            yield b"--%s\r\n" % self.boundary
+            yield part.render_headers()
+            iterator = part.iter_chunks()
+            try:
+                async for chunk in iterator:
+                    yield chunk
+            finally:
+                await iterator.aclose()
+            yield b"\r\n"
+        yield b"--%s--\r\n" % self.boundary
+
+    async def aclose(self):
+        iterators, self.iterators = self.iterators, []
+        for iterator in iterators:
+            await iterator.aclose()
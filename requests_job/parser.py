@@ -1,7 +1,7 @@
 import re
 
 from .sandbox import EvalStr
-from .yaml import LoaderBase, constructor
+from .yaml import CLoaderBase, LoaderBase, constructor
 
 
 class RefStr(str):
@@ -15,7 +15,7 @@ class TypeStr(str):
 PATTERN_EVAL = re.compile(r"\$\{(.*)\}")
 
 
-class AppLoader(LoaderBase):
+class AppLoaderMixin:
     # Dumper = None
     # PATTERN_ENV = re.compile(r"\$\{(.*)\}")
     RESOLVERS = {"!env_var": PATTERN_EVAL}
@@ -48,6 +48,22 @@ class AppLoader(LoaderBase):
         return TypeStr(value)
 
 
+class PyAppLoader(AppLoaderMixin, LoaderBase):
+    pass
+
+
+if CLoaderBase is not None:
+
+    class CAppLoader(AppLoaderMixin, CLoaderBase):  # type: ignore
+        pass
+
+else:
+    CAppLoader = None  # type: ignore
+
+# libyamlが利用できる場合は、Cで実装されたローダーを用いる
+AppLoader = CAppLoader or PyAppLoader
+
+
 class Parser:
     __loader__ = AppLoader
 
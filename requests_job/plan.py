@@ -0,0 +1,122 @@
+from types import MappingProxyType
+from typing import Iterable, Iterator, Mapping, NamedTuple, Tuple, Union
+
+from .client import HookPipeline
+from .exceptions import InvalidRowError
+from .schemas import Job, Profile, Task
+
+
+class TaskPlan(NamedTuple):
+    """親の設定を継承済みのタスクと、リクエストごとに変わらない値をまとめた不変の実行計画。"""
+
+    name: str
+    task: Task
+    pipeline: HookPipeline
+    # filesを送信するタスクは、リクエストごとに本文のストリームを作り直すためNone
+    request_args: Union[Mapping, None]
+    # parametrizeの行をリクエストに適用できなかった場合のエラー
+    error: Union[InvalidRowError, None] = None
+
+    def build_request_args(self) -> Mapping:
+        if self.error is not None:
+            raise self.error
+        if self.request_args is None:
+            return self.task.build_request_args(include_event_hooks=False)
+        return self.request_args
+
+    def __reduce__(self):
+        # MappingProxyTypeはpickleできないため、辞書として保存する
+        # 認証情報を持つauthのインスタンスは保存せず、復元時にタスクから作り直す
+        args = None
+        if self.request_args is not None:
+            args = {k: v for k, v in self.request_args.items() if k != "auth"}
+        return (
+            _restore_task_plan,
+            (self.name, self.task, self.pipeline, args, self.error),
+        )
+
+
+def _restore_task_plan(name, task, pipeline, request_args, error=None) -> TaskPlan:
+    if request_args is not None:
+        request_args["auth"] = task._get_auth()
+        request_args = MappingProxyType(request_args)
+    return TaskPlan(name, task, pipeline, request_args, error)
+
+
+def expand_task(plan: TaskPlan) -> Iterator[TaskPlan]:
+    """parametrizeの行ごとに、リクエストの引数を適用したタスクを返す。行は必要になった時点で読み込まれる。
+
+    行を適用できない場合は、送信時にInvalidRowErrorを送出するタスクを返す。
+    """
+    task = plan.task
+    base = plan.request_args
+    for index, row in enumerate(task.iter_rows()):
+        try:
+            if base is None:
+                # ファイルを送信する場合は、行ごとに本文のストリームを作る
+                args = task.build_request_args(include_event_hooks=False, row=row)
+            else:
+                args = dict(base)
+                task.apply_row(args, row)
+        except Exception as e:
+            # 不正な行は失敗したタスクとして扱い、残りの行の送信を続ける
+            yield plan._replace(error=InvalidRowError(plan.name, index, e))
+        else:
+            yield plan._replace(request_args=args)
+
+
+class ExpandedTasks:
+    """parametrizeを持つタスクを展開しながら返す、再反復可能なタスクの列です。
+
+    展開したタスクを保持しないため、反復するたびにデータソースを先頭から読み込む。
+    """
+
+    def __init__(self, tasks: Tuple[TaskPlan, ...]):
+        self.tasks = tasks
+
+    def __iter__(self) -> Iterator[TaskPlan]:
+        for plan in self.tasks:
+            if plan.task.parametrize is None:
+                yield plan
+            else:
+                yield from expand_task(plan)
+
+
+class JobPlan(NamedTuple):
+    name: str
+    job: Job
+    tasks: Tuple[TaskPlan, ...]
+    dependencies: Union[Tuple[Tuple[int, ...], ...], None]
+
+    def iter_tasks(self) -> Iterable[TaskPlan]:
+        """送信するタスクを返す。parametrizeを持つタスクは行ごとに遅延して展開される。"""
+        if any(x.task.parametrize for x in self.tasks):
+            return ExpandedTasks(self.tasks)
+        return self.tasks
+
+
+class ProfilePlan(NamedTuple):
+    jobs: Tuple[JobPlan, ...]
+
+
+def compile_task(task: Task) -> TaskPlan:
+    if task.files:
+        request_args = None
+    else:
+        request_args = MappingProxyType(
+            task.build_request_args(include_event_hooks=False)
+        )
+    return TaskPlan(task.name, task, task.compile_hooks(), request_args)
+
+
+def compile_job(job: Job) -> JobPlan:
+    """タスクの継承、フックの構築、依存関係の解決を一度だけ行う。"""
+    tasks = tuple(compile_task(x) for x in job.tasks)
+    dependencies = job.get_dependencies()
+    if dependencies is not None:
+        dependencies = tuple(tuple(x) for x in dependencies)  # type: ignore
+    return JobPlan(job.name, job, tasks, dependencies)  # type: ignore
+
+
+def compile_profile(profile: Profile) -> ProfilePlan:
+    return ProfilePlan(tuple(compile_job(x) for x in profile.jobs))
@@ -0,0 +1,227 @@
+import asyncio
+import heapq
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Sequence,
+    Union,
+)
+
+
+class OrderedEmitter:
+    """完了順に届いた結果を、入力順に並べ替えてコールバックへ渡す。"""
+
+    def __init__(self, callback: Union[Callable[[Any], Any], None] = None):
+        self.callback = callback
+        self.pending: dict = {}
+        self.next_index = 0
+
+    def push(self, index: int, result):
+        if self.callback is None:
+            return
+
+        self.pending[index] = result
+        while self.next_index in self.pending:
+            self.callback(self.pending.pop(self.next_index))
+            self.next_index += 1
+
+    def flush(self):
+        """欠番を無視して、保留中の結果を入力順に全て渡す。"""
+        if self.callback is None:
+            return
+
+        for index in sorted(self.pending):
+            self.callback(self.pending.pop(index))
+
+
+async def gather_or_cancel(*aws: Awaitable):
+    """全てのコルーチンを並行に実行する。いずれかが失敗した場合は残りをキャンセルして例外を送出する。"""
+    tasks = [asyncio.ensure_future(x) for x in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def aenumerate(iterable: AsyncIterable) -> AsyncIterator:
+    """enumerateの非同期イテラブル版です。"""
+    index = 0
+    async for item in iterable:
+        yield index, item
+        index += 1
+
+
+async def bounded_map(
+    func: Callable[[Any], Awaitable],
+    iterable: Union[Iterable, AsyncIterable],
+    concurrency: int,
+    token,
+    callback: Union[Callable[[Any], Any], None] = None,
+    ordered: bool = True,
+    max_pending: Union[int, None] = None,
+):
+    """iterableの要素を最大concurrency個まで並行してfuncに渡す。
+
+    要素は必要になった時点で取り出されるため、iterableは遅延評価されたままで構わない。
+    非同期イテラブルを渡した場合は、要素を待つ間も実行中のfuncを止めない。
+    callbackには入力順に結果が渡される。orderedが偽の場合は完了順に渡される。
+    max_pendingを指定した場合、入力順に並べ替えるために保留している結果がmax_pendingに達すると、
+    先頭の要素が完了するまで新しい要素を取り出さない。
+    """
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be greater than 0: {concurrency}")
+
+    iterator: Union[Iterator, None] = None
+    aiterator: Union[AsyncIterator, None] = None
+    if isinstance(iterable, AsyncIterable):
+        aiterator = aenumerate(iterable)
+    else:
+        iterator = enumerate(iterable)
+    # 非同期ジェネレータは並行してanextできないため、取り出しを直列にする
+    lock = asyncio.Lock()
+
+    if ordered:
+        emitter = OrderedEmitter(callback)
+        push = emitter.push
+    else:
+
+        def push(index: int, result):
+            if callback is not None:
+                callback(result)
+
+    limited = ordered and max_pending is not None
+    condition = asyncio.Condition() if limited else None
+
+    async def worker():
+        while not token.is_cancelled:
+            if condition is not None:
+                async with condition:
+                    await condition.wait_for(
+                        lambda: len(emitter.pending) < max_pending  # type: ignore
+                    )
+            try:
+                if iterator is not None:
+                    index, item = next(iterator)
+                else:
+                    async with lock:
+                        index, item = await aiterator.__anext__()  # type: ignore
+            except (StopIteration, StopAsyncIteration):
+                return
+            result = await func(item)
+            push(index, result)
+            if condition is not None:
+                async with condition:
+                    condition.notify_all()
+
+    await gather_or_cancel(*(worker() for _ in range(concurrency)))
+
+
+def resolve_dependencies(
+    names: Sequence[str], depends_on: Sequence[Iterable[str]]
+) -> List[List[int]]:
+    """名前で指定された依存関係をインデックスのリストに変換する。
+
+    存在しない名前、重複して曖昧な名前、循環する依存関係はValueErrorとなる。
+    """
+    indexes: dict = {}
+    for index, name in enumerate(names):
+        indexes.setdefault(name, []).append(index)
+
+    predecessors = []
+    for index, depends in enumerate(depends_on):
+        resolved = []
+        for name in depends:
+            found = indexes.get(name, [])
+            if not found:
+                raise ValueError(f"{names[index]!r} depends on unknown task: {name!r}")
+            if len(found) > 1:
+                raise ValueError(
+                    f"{names[index]!r} depends on ambiguous task: {name!r}"
+                )
+            if found[0] == index:
+                raise ValueError(f"{name!r} depends on itself.")
+            resolved.append(found[0])
+        predecessors.append(resolved)
+
+    remaining = [len(x) for x in predecessors]
+    successors = _get_successors(predecessors)
+    ready = [i for i, count in enumerate(remaining) if count == 0]
+    visited = 0
+    while ready:
+        index = ready.pop()
+        visited += 1
+        for successor in successors[index]:
+            remaining[successor] -= 1
+            if remaining[successor] == 0:
+                ready.append(successor)
+
+    if visited != len(predecessors):
+        cycle = [names[i] for i, count in enumerate(remaining) if count]
+        raise ValueError(f"circular dependency: {cycle}")
+
+    return predecessors
+
+
+def _get_successors(predecessors: Sequence[Sequence[int]]) -> List[List[int]]:
+    successors: List[List[int]] = [[] for _ in predecessors]
+    for index, depends in enumerate(predecessors):
+        for predecessor in depends:
+            successors[predecessor].append(index)
+    return successors
+
+
+async def run_graph(
+    func: Callable[[Any], Awaitable],
+    items: Sequence,
+    predecessors: Sequence[Sequence[int]],
+    concurrency: int,
+    token,
+    callback: Union[Callable[[Any], Any], None] = None,
+):
+    """依存先が全て完了した要素から順に、最大concurrency個まで並行してfuncに渡す。
+
+    実行可能な要素が複数ある場合は、入力順が早いものから実行する。
+    callbackには入力順に結果が渡される。
+    """
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be greater than 0: {concurrency}")
+
+    remaining = [len(x) for x in predecessors]
+    successors = _get_successors(predecessors)
+    ready = [i for i, count in enumerate(remaining) if count == 0]
+    heapq.heapify(ready)
+    emitter = OrderedEmitter(callback)
+    running: dict = {}
+
+    try:
+        while ready or running:
+            while ready and len(running) < concurrency and not token.is_cancelled:
+                index = heapq.heappop(ready)
+                running[asyncio.ensure_future(func(items[index]))] = index
+
+            if not running:
+                break
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = running.pop(task)
+                emitter.push(index, task.result())
+                for successor in successors[index]:
+                    remaining[successor] -= 1
+                    if remaining[successor] == 0:
+                        heapq.heappush(ready, successor)
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+    emitter.flush()
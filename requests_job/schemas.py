@@ -2,11 +2,14 @@ from datetime import date, datetime
 from functools import lru_cache
 from typing import Any, Dict, Iterator, List, Literal, Set, Union
 
-from pydantic import Field, FilePath, root_validator, validator
+from pydantic import Field, FilePath, PrivateAttr, root_validator, validator
 from pydantic.typing import Annotated as _
 
+from . import datasource, scheduler
 from .abc import BaseModel
-from .utils import merge, merge_objects
+from .client import HookPipeline, wrap_hook
+from .multipart import MultipartStream
+from .utils import merge
 from .values import (
     Alias,
     AttrPath,
@@ -18,6 +21,7 @@ from .values import (
     Transport,
     Verify,
 )
+from .verifier import StreamVerifier, Verifier
 
 # from .sandbox import evalute_recursive, eval, Context, EvalStr
 # from . import resolver
@@ -54,6 +58,88 @@ class Extension(BaseModel):
     aliases: Dict[Alias, AttrPath] = {}
 
 
+class Stage(BaseModel):
+    name: str = ""
+    duration: float = Field(..., gt=0, description="ステージの秒数です。")
+    target: float = Field(..., ge=0, description="ステージ終了時の1秒あたりのリクエスト数です。")
+    start: Union[float, None] = Field(
+        None, ge=0, description="ステージ開始時の1秒あたりのリクエスト数です。省略した場合は直前のステージのtarget（最初のステージは0）です。"
+    )
+    warmup: bool = Field(False, description="ウォームアップとして、全体の集計から除外します。")
+
+
+class Load(BaseModel):
+    """タスクを指定した到着率で送信する負荷試験の設定です。
+    タスクは応答を待たずに定義順に繰り返し送信されます。depends_onは無視されます。
+    到着率はrateとdurationで一定にするか、stagesで段階的に変化させます。
+    """
+
+    rate: Union[float, None] = Field(None, gt=0, description="1秒あたりに送信するリクエストの数です。")
+    duration: Union[float, None] = Field(None, gt=0, description="負荷をかける秒数です。")
+    stages: List[Stage] = Field([], description="到着率をステージごとに線形に変化させます。")
+    max_outstanding: int = Field(
+        100, ge=1, description="応答待ちのリクエストの上限です。上限を超えるリクエストは送信せずに破棄されます。"
+    )
+
+    @root_validator
+    def validate_shape(cls, values):
+        if values.get("stages"):
+            if values.get("rate") is not None or values.get("duration") is not None:
+                raise ValueError("rate and duration cannot be combined with stages.")
+        elif values.get("rate") is None or values.get("duration") is None:
+            raise ValueError("rate and duration are required without stages.")
+        return values
+
+    def get_stages(self) -> List[Stage]:
+        """startを補完したステージを返す。stagesがない場合は一定の到着率のステージを一つ返す。"""
+        if not self.stages:
+            return [Stage(start=self.rate, target=self.rate, duration=self.duration)]
+
+        stages = []
+        previous = 0.0
+        for i, stage in enumerate(self.stages):
+            start = previous if stage.start is None else stage.start
+            name = stage.name or f"stage_{i}"
+            stages.append(stage.copy(update={"start": start, "name": name}))
+            previous = stage.target
+        return stages
+
+
+class Parametrize(BaseModel):
+    """タスクをデータソースの行ごとに展開し、一行につき一つのリクエストを送信します。
+    行はリクエストの送信時にファイルから順番に読み込まれるため、行数に関わらずメモリの使用量は一定です。
+    """
+
+    source: FilePath = Field(..., description="csvまたはjsonlファイルのパスです。")
+    format: Union[Literal["csv", "jsonl"], None] = Field(
+        None, description="省略した場合は拡張子から判定します。"
+    )
+    extra: Literal["params", "json", "data"] = Field(
+        "params", description="urlに埋め込まない列の送信先です。"
+    )
+
+    @root_validator
+    def validate_format(cls, values):
+        source = values.get("source", None)
+        if source is not None and values.get("format") is None:
+            format = datasource.guess_format(source)
+            if format is None:
+                raise ValueError(f"cannot guess the format of {source}.")
+            values["format"] = format
+        return values
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        return datasource.iter_rows(self.source, self.format)
+
+    def get_columns(self) -> Union[List[str], None]:
+        return datasource.get_columns(self.source, self.format)
+
+
+class Execution(BaseModel):
+    concurrency: int = Field(1, ge=1, description="ジョブ内で同時に実行するタスクの数です。")
+    load: Union[Load, None] = Field(None, description="設定した場合、ジョブを負荷試験として実行します。")
+
+
 class ClientRequestCommon:
     __fields__ = {"params", "headers", "cookies"}
 
@@ -81,23 +167,92 @@ class ClientRequestCommon:
         return merge(obj1, obj2)
 
 
+def _merge_value(parent_value, child_value):
+    """merge_objectsと同じ規則で、検証済みの値を辞書に変換せずに結合する。
+
+    listは連結、setは和集合、dictとEventHooksはキーごとに子の値で上書きする。
+    その他のモデルは検証済みの組み合わせを保つため、子の値で丸ごと置き換える。
+    （例えばLoadのrateとstagesや、種類の異なるtransportのkwargsを混ぜない）
+    """
+    if parent_value is None:
+        return child_value
+    elif isinstance(child_value, list) and isinstance(parent_value, list):
+        return parent_value + child_value
+    elif isinstance(child_value, set) and isinstance(parent_value, set):
+        return parent_value | child_value
+    elif isinstance(child_value, dict) and isinstance(parent_value, dict):
+        return {**parent_value, **child_value}
+    elif type(child_value) is type(parent_value) and isinstance(
+        child_value, EventHooks
+    ):
+        values = dict(parent_value.__dict__)
+        for name in child_value.__fields_set__:
+            values[name] = getattr(child_value, name)
+        return child_value.construct(
+            _fields_set=parent_value.__fields_set__ | child_value.__fields_set__,
+            **values,
+        )
+    else:
+        return child_value
+
+
+def _merge_parent(parent: BaseModel, child: BaseModel, fields: frozenset):
+    """親のfieldsを継承した子のモデルを、再検証せずに作成する。
+
+    親も子も検証済みで、結合した値も同じ型になるため、construct()で組み立てる。
+    ファイルの存在確認やモジュールのimportなどの検証は、プロファイルの読み込み時に一度だけ行われる。
+    作成したモデルは親や子と値を共有するため、変更してはいけない。
+    """
+    values = dict(child.__dict__)
+    for name in fields - ClientRequestCommon.__fields__:
+        if name in child.__fields_set__:
+            values[name] = _merge_value(getattr(parent, name), values[name])
+        else:
+            values[name] = getattr(parent, name)
+
+    # params, headers, cookiesは親と子の値を結合する
+    for name in ClientRequestCommon.__fields__:
+        values[name] = merge(getattr(parent, name), values[name])
+
+    fields_set = child.__fields_set__ | fields | ClientRequestCommon.__fields__
+    return child.construct(_fields_set=fields_set, **values)
+
+
+class Hook(BaseModel):
+    func: AttrPath
+    policy: Literal["inline", "thread", "process"] = Field(
+        "inline",
+        description="inline: イベントループ上で実行します。thread: スレッドプールで実行します。process: プロセスプールで実行します（関数と引数はpickle可能である必要があります。build_request, request, responseには使えません）。",
+    )
+
+    def get_value(self):
+        return wrap_hook(self.func.value.attr, self.policy)
+
+
+Hooks = Union[List[Union[AttrPath, Hook]], None]
+
+
 class EventHooks(BaseModel):
     """リクエストとレスポンスをトリガーします。
     例外を上げると後続のイベントフックは実行されません。
+    フックは`module:attr`または`{func: module:attr, policy: thread}`の形式で指定します。
     """
 
-    build_request: Union[List[AttrPath], None] = Field(
+    build_request: Hooks = Field(
         None, description="想定しているリクエストが構成されない場合、リクエストを書き換えることができます。"
     )
-    request: Union[List[AttrPath], None] = Field(None, description="リクエスト時にトリガーされます。")
-    response: Union[List[AttrPath], None] = Field(
+    request: Hooks = Field(None, description="リクエスト時にトリガーされます。")
+    response: Hooks = Field(
         None, description="応答時にトリガーされます。通信エラーの場合は、トリガーされません。"
     )
-    expect: Union[List[AttrPath], None] = None
-    success: Union[List[AttrPath], None] = None
-    error: Union[List[AttrPath], None] = None
-    complete: Union[List[AttrPath], None] = None
-    exception: Union[List[AttrPath], None] = None
+    expect: Hooks = None
+    success: Hooks = None
+    error: Hooks = None
+    complete: Hooks = None
+    exception: Hooks = None
+    concurrent: Set[Literal["success", "error", "complete", "exception"]] = Field(
+        set(), description="指定したイベントのフックを、順序を保証せずに並行して実行します。"
+    )
     asgi_startup: Union[List[AttrPath], None] = Field(
         None, description="asgiアプリケーションの起動前にトリガーされ、アプリケーションのインスタンスにアクセスすることができます"
     )
@@ -105,6 +260,13 @@ class EventHooks(BaseModel):
         None, description="asgiアプリケーションの終了後にトリガーされ、アプリケーションのインスタンスにアクセスすることができます"
     )
 
+    @validator("build_request", "request", "response")
+    def no_process_policy(cls, v, field):
+        # プロセスにはリクエストやレスポンスの複製が渡るため、書き換えや本文のストリームが反映されない
+        if v and any(isinstance(x, Hook) and x.policy == "process" for x in v):
+            raise ValueError(f"process policy is not supported for {field.name} hooks.")
+        return v
+
 
 class Client(BaseModel):
     # fmt: off
@@ -162,6 +324,14 @@ class Request(BaseModel):
     auth: Union[Auth, None] = None
     allow_redirects: bool = True
     timeout: Union[float, None] = None
+    stream: bool = Field(
+        False, description="レスポンスの本文をメモリに保持せず、受信しながら検証します。"
+    )
+    spool_threshold: Union[int, None] = Field(
+        None,
+        ge=0,
+        description="レスポンスの本文がこのバイト数を超える場合、一時ファイルに書き出してメモリマップで参照します。本文はrequests_job.spoolのget_body, get_text, get_jsonで参照します。",
+    )
 
     @validator("method", pre=True)
     def upper_method(cls, v):
@@ -176,6 +346,9 @@ class Response(BaseModel):
 
 
 class Task(Request, Extension):
+    __verifier__ = Verifier
+    __stream_verifier__ = StreamVerifier
+
     name: str = ""
     kwargs: Union[Dict[str, Any], None] = Field(
         None,
@@ -186,9 +359,41 @@ class Task(Request, Extension):
     )
     expect: Union[Dict[str, Any], None]
     tags: Set[str] = set()
+    depends_on: List[str] = Field(
+        [], description="指定した名前のタスクが全て完了してから実行されます。"
+    )
+    parametrize: Union[Parametrize, None] = Field(
+        None,
+        description="データソースの行ごとにリクエストを送信します。行の値はkwargsより優先されます。",
+    )
+
+    @root_validator
+    def validate_parametrize(cls, values):
+        parametrize: Union[Parametrize, None] = values.get("parametrize", None)
+        if parametrize is None or "url" not in values:
+            return values
+
+        extra = parametrize.extra
+        if extra in {"json", "data"} and values.get("content", None) is not None:
+            raise ValueError(f"parametrize.extra: {extra} cannot be combined with content.")
+
+        # 全ての行を読まずに、ヘッダ（jsonlは最初の行）でurlのキーワードを確認する
+        columns = parametrize.get_columns()
+        if columns is not None:
+            missing = values["url"].keywords - set(values.get("kwargs", None) or {})
+            missing -= set(columns)
+            if missing:
+                raise ValueError(
+                    f"{parametrize.source} has no columns for url keywords: {sorted(missing)}"
+                )
+        return values
 
     @root_validator
     def merge_kwargs(cls, values):
+        # 展開するタスクは、行ごとにurlを組み立てる
+        if values.get("parametrize", None) is not None:
+            return values
+
         url: FString = values["url"]
         kwargs = values.get("kwargs", {})
         kwargs = kwargs or {}  # None対策
@@ -206,7 +411,8 @@ class Task(Request, Extension):
         additional_params = {k: v for k, v in kwargs.items() if k not in pulled_kwargs}
         new_params = merge(params, additional_params)
 
-        values["url"] = FString(new_url)
+        # 埋め込んだ値の{}をキーワードとして解釈しないように、展開済みの文字列として保持する
+        values["url"] = FString.literal(new_url)
         values["params"] = new_params
         values["kwargs"] = None
         return values
@@ -219,24 +425,15 @@ class Task(Request, Extension):
         return frozenset(includes ^ excludes)
 
     def merge_parent(self, parent: "Job"):
-        fields = self._include_fields()
-        job_setting = parent.dict(include=fields)
-        exclude = ClientRequestCommon.__fields__
-        # exclude.pop("")
-        task_setting = self.dict(exclude_unset=True, by_alias=True, exclude=exclude)
-        merged = merge_objects(job_setting, task_setting)
-
-        if self.url.keywords:
-            kwargs = self.kwargs or {}
-            params = self.params or {}
-            keywords = {k: v for k, v in kwargs.items()}
-            params = {k: v for k, v in kwargs.items() if k not in keywords}
-            url = self.url.format(**keywords)
-        else:
-            params = merge(self.params, self.kwargs)
-        return Task(**merged)
-
-    def build_request_args(self, exclude_unset: bool = True):
+        """ジョブの設定を継承したタスクを返す。"""
+        return _merge_parent(parent, self, self._include_fields())
+
+    def build_request_args(
+        self,
+        exclude_unset: bool = True,
+        include_event_hooks: bool = True,
+        row: Dict[str, Any] = None,
+    ):
         fields = set(Request.__fields__)
         dic = self.dict(
             include=fields,
@@ -244,11 +441,34 @@ class Task(Request, Extension):
             exclude_none=True,
             by_alias=True,
         )
-        dic["event_hooks"] = self._get_event_hooks()
+        if include_event_hooks:
+            dic["event_hooks"] = self._get_event_hooks()
         dic["auth"] = self._get_auth()
+        if row is not None:
+            self.apply_row(dic, row)
         self._attache_files(dic)
         return dic
 
+    def apply_row(self, dic: dict, row: Dict[str, Any]):
+        """parametrizeの行をリクエストの引数に適用する。
+
+        urlのキーワードに一致する列はurlに埋め込み、それ以外の列はparametrize.extraに追加する。
+        """
+        kwargs = {**self.kwargs, **row} if self.kwargs else row
+        url = self.url
+        dic["url"] = url.format_map(kwargs)
+
+        keywords = url.keywords
+        extra = {k: v for k, v in kwargs.items() if k not in keywords}
+        if extra:
+            key = self.parametrize.extra if self.parametrize else "params"
+            dic[key] = merge(dic.get(key, None), extra)
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        if self.parametrize is None:
+            raise ValueError("parametrize is not configured.")
+        return self.parametrize.iter_rows()
+
     def _get_auth(self):
         if self.auth:
             return self.auth.get_value()
@@ -256,17 +476,29 @@ class Task(Request, Extension):
             return None
 
     def _attache_files(self, dic: dict):
+        dic.pop("files", None)
         if not self.files:
-            dic.pop("files", None)
             return
 
         if isinstance(self.files, File):
-            dic["files"] = self.files.get_value()
+            files = [self.files.get_value()]
         elif isinstance(self.files, MultiFile):
-            dic["files"] = self.files.get_value()
+            files = self.files.get_value()
         else:
             raise Exception()
 
+        # ファイルを一度にメモリへ読み込まないように、本文をストリームで送信する
+        stream = MultipartStream(dic.pop("data", None), files)
+        dic["content"] = stream
+        dic["headers"] = merge(dic.get("headers", None), stream.get_headers())
+
+    def compile_hooks(self) -> HookPipeline:
+        """イベントフックと期待値の検証を、不変のパイプラインとして一度だけ構築する。"""
+        event_hooks = self._get_event_hooks()
+        verifier = self.__stream_verifier__ if self.stream else self.__verifier__
+        event_hooks["expect"].append(verifier(self.expect or {}))
+        return HookPipeline.from_dict(event_hooks)
+
     def _get_event_hooks(self):
         events = self.event_hooks
         event_hooks = {
@@ -283,12 +515,16 @@ class Task(Request, Extension):
         }
         keys = set(event_hooks)
         for key in keys:
-            event_hooks[key] = [x.value.attr for x in event_hooks[key]]
+            event_hooks[key] = [
+                x.get_value() if isinstance(x, Hook) else x.value.attr
+                for x in event_hooks[key]
+            ]
 
+        event_hooks["concurrent"] = events.concurrent
         return event_hooks
 
 
-class Job(Client, Extension):
+class Job(Client, Extension, Execution):
     name: str
     nodes: List[Task] = Field([], alias="tasks")
     tags: Set[str] = set()
@@ -298,28 +534,40 @@ class Job(Client, Extension):
         for task in self.nodes:
             yield task.merge_parent(self)
 
+    @validator("nodes")
+    def validate_dependencies(cls, v: List[Task]):
+        if any(x.depends_on for x in v) and any(x.parametrize for x in v):
+            raise ValueError("parametrize cannot be combined with depends_on.")
+        cls._resolve_dependencies(v)
+        return v
+
+    @staticmethod
+    def _resolve_dependencies(tasks: List[Task]):
+        if not any(x.depends_on for x in tasks):
+            return None
+
+        names = [x.name for x in tasks]
+        depends_on = [x.depends_on for x in tasks]
+        return scheduler.resolve_dependencies(names, depends_on)
+
+    def get_dependencies(self) -> Union[List[List[int]], None]:
+        """タスクの依存先をインデックスで返す。依存関係が定義されていない場合はNoneを返す。"""
+        return self._resolve_dependencies(self.nodes)
+
     @staticmethod
     @lru_cache
     def _include_fields():
-        includes = set(Extension.__fields__) | set(Client.__fields__)
+        includes = (
+            set(Extension.__fields__)
+            | set(Client.__fields__)
+            | set(Execution.__fields__)
+        )
         excludes = ClientRequestCommon.__fields__
         return frozenset(includes ^ excludes)
 
     def merge_parent(self, parent: "Profile"):
-        fields = self._include_fields()
-        root_setting = parent.dict(include=fields)
-        job_setting = self.dict(
-            exclude_unset=True, by_alias=True, exclude=ClientRequestCommon.__fields__
-        )
-        merged = merge_objects(root_setting, job_setting)
-        merged["params"] = ClientRequestCommon.merge_params(parent.params, self.params)
-        merged["headers"] = ClientRequestCommon.merge_headers(
-            parent.headers, self.headers
-        )
-        merged["cookies"] = ClientRequestCommon.merge_cookies(
-            parent.cookies, self.cookies
-        )
-        return Job(**merged)
+        """プロファイルの設定を継承したジョブを返す。"""
+        return _merge_parent(parent, self, self._include_fields())
 
     def build_client_args(self, exclude_unset: bool = True):
         fields = set(Client.__fields__)
@@ -389,18 +637,38 @@ class Job(Client, Extension):
             return None
 
 
-class Profile(Client, Extension):
+class Profile(Client, Extension, Execution):
     version: Literal[0] = 0
     name: str = ""
     nodes: List[Job] = Field([], alias="jobs")
     tags: Set[str] = {"minutes", "hour", "daily", "month"}
     env: dict = {}
+    parallel_jobs: int = Field(1, ge=1, description="同時に実行するジョブの数です。")
+    fail_fast: bool = Field(
+        False, description="いずれかのジョブが失敗した場合、実行中の他のジョブをキャンセルします。"
+    )
+
+    _plan: Any = PrivateAttr(None)
 
     @property
     def jobs(self) -> Iterator[Job]:
         for job in self.nodes:
             yield job.merge_parent(self)
 
+    def get_plan(self):
+        """継承を解決した実行計画を返す。計画は一度だけ作成され、プロファイルにキャッシュされる。
+
+        作成後にプロファイルを変更した場合は、clear_plan()でキャッシュを破棄してください。
+        """
+        if self._plan is None:
+            from .plan import compile_profile
+
+            self._plan = compile_profile(self)
+        return self._plan
+
+    def clear_plan(self):
+        self._plan = None
+
     # def __init__(self, **kwargs):
     #     ctx, new_kwargs = self.create_context_and_evalute(kwargs)
     #     super().__init__(**new_kwargs)
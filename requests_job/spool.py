@@ -0,0 +1,155 @@
+import codecs
+import json
+import mmap
+import tempfile
+import weakref
+from typing import Iterator, Union
+
+from httpx import Response
+
+from .streaming import JsonStreamParser
+
+SPOOL_KEY = "requests_job.spool"
+
+
+class SpooledBody:
+    """一時ファイルに書き出したレスポンスの本文を、メモリマップで参照する。
+
+    view()はファイルの内容を複製せずに参照するmemoryviewを返す。
+    read_response()で作成した場合は、レスポンスが破棄された時点で閉じる。close()の後はviewを参照できない。
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.size = file.seek(0, 2)
+        # 空のファイルはメモリマップできない
+        self.mmap = (
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        )
+
+    def view(self) -> memoryview:
+        if self.mmap is None:
+            return memoryview(b"")
+        return memoryview(self.mmap)
+
+    def __len__(self):
+        return self.size
+
+    def __reduce__(self):
+        # processポリシーのフックへ渡す場合は、本文を複製して渡す
+        return (_MemoryBody, (self.view().tobytes(),))
+
+    def close(self):
+        self.file.close()
+        if self.mmap is not None:
+            try:
+                self.mmap.close()
+            except BufferError:
+                # フックがviewを保持している場合は、参照が無くなった時点で解放される
+                pass
+
+
+class _MemoryBody:
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def view(self) -> memoryview:
+        return memoryview(self.content)
+
+    def __len__(self):
+        return len(self.content)
+
+    def close(self):
+        pass
+
+
+async def read_response(
+    response: Response, threshold: int, chunk_size: int = 65536
+) -> Union[SpooledBody, None]:
+    """ストリームで受信したレスポンスの本文を読み込む。
+
+    Content-Lengthがthresholdバイト以下の場合は、通常どおりresponse.contentに保持してNoneを返す。
+    それ以外の場合は本文をresponse.extensionsに保持して返す。本文がthresholdを超えた場合は、
+    受信しながら一時ファイルへ書き出したSpooledBodyとなる。
+    保持した本文はget_body, get_text, get_jsonで参照する（response.contentでは参照できない）。
+    """
+    length = response.headers.get("Content-Length")
+    if length is not None and length.isdigit() and int(length) <= threshold:
+        await response.aread()
+        return None
+
+    buffer = bytearray()
+    file = None
+    try:
+        async for chunk in response.aiter_bytes(chunk_size):
+            if file is not None:
+                file.write(chunk)
+                continue
+
+            buffer += chunk
+            if len(buffer) > threshold:
+                file = tempfile.TemporaryFile()
+                file.write(buffer)
+                buffer = bytearray()
+    except BaseException:
+        if file is not None:
+            file.close()
+        raise
+
+    if file is None:
+        body: Union[SpooledBody, _MemoryBody] = _MemoryBody(bytes(buffer))
+    else:
+        file.flush()
+        body = SpooledBody(file)
+        # 一時ファイルとメモリマップは、レスポンスと同じ期間だけ保持する
+        weakref.finalize(response, body.close)
+    response.extensions[SPOOL_KEY] = body
+    return body
+
+
+def get_spool(response: Response) -> Union[SpooledBody, _MemoryBody, None]:
+    return response.extensions.get(SPOOL_KEY, None)
+
+
+def get_body(response: Response) -> memoryview:
+    """レスポンスの本文を、一時ファイルに書き出されているかに関わらずmemoryviewで返す。"""
+    spool = get_spool(response)
+    if spool is None:
+        return memoryview(response.content)
+    return spool.view()
+
+
+def iter_text(response: Response, chunk_size: int = 65536) -> Iterator[str]:
+    """レスポンスの本文を、chunk_sizeバイトずつ復号しながら返す。"""
+    view = get_body(response)
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")("replace")
+    for i in range(0, len(view), chunk_size):
+        text = decoder.decode(view[i : i + chunk_size])
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def get_text(response: Response) -> str:
+    spool = get_spool(response)
+    if spool is None:
+        return response.text
+    return "".join(iter_text(response))
+
+
+def get_json(response: Response):
+    """レスポンスの本文をJSONとして解析する。
+
+    一時ファイルに書き出した本文は、文字列に複製せずに少しずつ復号しながら解析する。
+    """
+    spool = get_spool(response)
+    if spool is None:
+        return response.json()
+    if isinstance(spool, _MemoryBody):
+        return json.loads(spool.content)
+    parser = JsonStreamParser({()})
+    for text in iter_text(response):
+        parser.feed(text)
+    return parser.close()[()]
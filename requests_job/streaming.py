@@ -0,0 +1,281 @@
+import codecs
+import hashlib
+import json
+import re
+from typing import Any, Dict, Iterable, List, Set, Tuple, Union
+
+from .exceptions import FailJSONDecode
+from .types import undefined
+
+Path = Tuple[Union[str, int], ...]
+
+
+def wanted_paths(expect, path: Path = ()) -> Set[Path]:
+    """期待値の辞書を辿り、実際の値を取り出す必要があるパスを返す。辞書以外の値はその位置で丸ごと取り出す。"""
+    if not isinstance(expect, dict):
+        return {path}
+
+    paths: Set[Path] = set()
+    for key, value in expect.items():
+        paths |= wanted_paths(value, path + (key,))
+    return paths
+
+
+def build_actual(values: Dict[Path, Any]):
+    """取り出した値をパスに従って辞書に組み立てる。取り出せなかったパスは含まれない。"""
+    if () in values:
+        return values[()]
+
+    actual: dict = {}
+    for path, value in values.items():
+        current = actual
+        for key in path[:-1]:
+            current = current.setdefault(key, {})
+        current[path[-1]] = value
+    return actual
+
+
+class JsonStreamParser:
+    """JSON文書を分割して受け取りながら解析し、指定したパスの値だけを組み立てる。
+
+    指定したパス以外の値は読み飛ばすため、メモリ使用量は取り出す値の大きさとネストの深さに比例する。
+    文字列はチャンクをまたいでも続きから走査し、取り出さない文字列の内容は保持しない。
+    1つの文書だけを解析するため、NDJSONのように複数の文書が続く本文はエラーとする。
+    """
+
+    TOKEN = re.compile(
+        r"""[ \t\n\r]*(?:
+        ([{}\[\]:,])
+        |(")
+        |(-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?)
+        |(true|false|null)
+        )""",
+        re.VERBOSE,
+    )
+    # 閉じる引用符の手前まで。末尾のバックスラッシュは次の文字と合わせて読むため含めない
+    STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+    WHITESPACE = re.compile(r"[ \t\n\r]*")
+    LITERALS = {"true": True, "false": False, "null": None}
+    # 数値の直後にこれらが続く場合は、数値がまだ途中の可能性がある（空文字はバッファの終端）
+    NUMBER_CONTINUES = {"", ".", "e", "E", "+", "-"}
+
+    def __init__(self, paths: Iterable[Path]):
+        self.paths = set(paths)
+        self.values: Dict[Path, Any] = {}
+        self.buffer = ""
+        # [type, key, state]
+        self.frames: List[list] = []
+        self.done = False
+        self.capturing: Union[Path, None] = None
+        self.builders: List[list] = []
+        # 文字列の途中の場合はTrue。stringsには取り出す文字列の断片を保持する（読み飛ばす場合はNone）
+        self.in_string = False
+        self.strings: Union[List[str], None] = None
+
+    def feed(self, text: str):
+        self.buffer += text
+        self._parse(final=False)
+
+    def close(self) -> Dict[Path, Any]:
+        self._parse(final=True)
+        if not self.done:
+            raise ValueError("unexpected end of JSON document.")
+        return self.values
+
+    def _parse(self, final: bool):
+        buffer = self.buffer
+        pos = 0
+        size = len(buffer)
+        match = self.TOKEN.match
+        while pos < size:
+            if self.in_string:
+                pos = self._scan_string(buffer, pos)
+                if self.in_string:
+                    break
+                continue
+
+            m = match(buffer, pos)
+            if m is None or (
+                m.group(3)
+                and not final
+                and buffer[m.end() : m.end() + 1] in self.NUMBER_CONTINUES
+            ):
+                # トークンが途中で分割されている場合は、次のデータを待つ
+                rest = self.WHITESPACE.match(buffer, pos).end()
+                if final and rest != size:
+                    raise ValueError(f"invalid JSON at: {buffer[rest:rest + 20]!r}")
+                if m is None:
+                    pos = rest
+                break
+            pos = m.end()
+            punct, quote, number, literal = m.groups()
+            if punct is not None:
+                self._on_punct(punct)
+            elif quote is not None:
+                self._start_string()
+            elif number is not None:
+                self._on_value(json.loads(number))
+            else:
+                self._on_value(self.LITERALS[literal])
+
+        if final and self.in_string:
+            raise ValueError("unterminated string in JSON document.")
+        self.buffer = buffer[pos:]
+
+    def _start_string(self):
+        frame = self.frames[-1] if self.frames else None
+        is_key = frame is not None and frame[2] in {"key", "key_or_end"}
+        if is_key or self.capturing is not None or self._path() in self.paths:
+            self.strings = []
+        else:
+            self.strings = None
+        self.in_string = True
+
+    def _scan_string(self, buffer: str, pos: int) -> int:
+        end = self.STRING_BODY.match(buffer, pos).end()
+        if self.strings is not None:
+            self.strings.append(buffer[pos:end])
+        if end < len(buffer) and buffer[end] == '"':
+            self.in_string = False
+            strings, self.strings = self.strings, None
+            self._on_string(None if strings is None else "".join(strings))
+            return end + 1
+        return end
+
+    def _path(self) -> Path:
+        return tuple(frame[1] for frame in self.frames)
+
+    def _expect_value(self):
+        if self.done:
+            raise ValueError(
+                "extra data after JSON document."
+                " multiple documents such as NDJSON are not supported."
+            )
+        if not self.frames:
+            return
+        frame = self.frames[-1]
+        if frame[2] not in {"value", "value_or_end"}:
+            raise ValueError(f"unexpected value in state: {frame[2]}")
+        frame[2] = "comma_or_end"
+
+    def _on_string(self, raw: Union[str, None]):
+        frame = self.frames[-1] if self.frames else None
+        if frame is not None and frame[2] in {"key", "key_or_end"}:
+            key = json.loads(f'"{raw}"') if "\\" in raw else raw  # type: ignore
+            frame[1] = key
+            frame[2] = "colon"
+            return
+        if raw is None:
+            self._on_value(undefined)
+        else:
+            self._on_value(json.loads(f'"{raw}"') if "\\" in raw else raw)
+
+    def _on_value(self, value):
+        self._expect_value()
+        if self.capturing is None and self._path() in self.paths:
+            self.values[self._path()] = value
+        elif self.capturing is not None:
+            self._add(value)
+        self._end_if_root()
+
+    def _on_punct(self, punct: str):
+        if punct == "{" or punct == "[":
+            self._expect_value()
+            path = self._path()
+            if self.capturing is None and path in self.paths:
+                self.capturing = path
+            if self.capturing is not None:
+                self.builders.append([{} if punct == "{" else []])
+            if punct == "{":
+                self.frames.append(["map", None, "key_or_end"])
+            else:
+                self.frames.append(["array", 0, "value_or_end"])
+            return
+
+        if not self.frames:
+            raise ValueError(f"unexpected: {punct}")
+        frame = self.frames[-1]
+        kind, key, state = frame
+
+        if punct == ":":
+            if state != "colon":
+                raise ValueError("unexpected: ':'")
+            frame[2] = "value"
+        elif punct == ",":
+            if state != "comma_or_end":
+                raise ValueError("unexpected: ','")
+            if kind == "map":
+                frame[2] = "key"
+            else:
+                frame[1] = key + 1
+                frame[2] = "value"
+        else:
+            closing = "}" if kind == "map" else "]"
+            if punct != closing or state not in {
+                "comma_or_end",
+                "key_or_end",
+                "value_or_end",
+            }:
+                raise ValueError(f"unexpected: {punct!r}")
+            self.frames.pop()
+            if self.capturing is not None:
+                container = self.builders.pop()[0]
+                if self.builders:
+                    self._add(container)
+                else:
+                    self.values[self.capturing] = container
+                    self.capturing = None
+            self._end_if_root()
+
+    def _add(self, value):
+        container = self.builders[-1][0]
+        if isinstance(container, dict):
+            container[self.frames[-1][1]] = value
+        else:
+            container.append(value)
+
+    def _end_if_root(self):
+        if not self.frames:
+            self.done = True
+
+
+class BodyAccumulator:
+    """受信した本文を保持せずに、サイズ、ダイジェスト、行数、JSONの値を集計する。"""
+
+    def __init__(self, expect_json=undefined):
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.lines = 0
+        self.last = b""
+        self.parser = None
+        self.decoder = None
+        self.error = None
+        if expect_json is not undefined:
+            self.parser = JsonStreamParser(wanted_paths(expect_json))
+            self.decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def feed(self, chunk: bytes):
+        if not chunk:
+            return
+        self.size += len(chunk)
+        self.sha256.update(chunk)
+        self.lines += chunk.count(b"\n")
+        self.last = chunk[-1:]
+        if self.parser is not None and self.error is None:
+            try:
+                self.parser.feed(self.decoder.decode(chunk))  # type: ignore
+            except ValueError as e:
+                self.error = e
+
+    def result(self) -> dict:
+        lines = self.lines + (1 if self.last and self.last != b"\n" else 0)
+        result = {"size": self.size, "sha256": self.sha256.hexdigest(), "lines": lines}
+        if self.parser is not None:
+            try:
+                if self.error is not None:
+                    raise self.error
+                self.parser.feed(self.decoder.decode(b"", final=True))  # type: ignore
+                result["json"] = build_actual(self.parser.close())
+            except ValueError as e:
+                result["json"] = FailJSONDecode(str(e))
+        return result
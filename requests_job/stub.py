@@ -0,0 +1,285 @@
+import asyncio
+import json
+import random
+import re
+from typing import Any, Callable, Dict, List, Literal, Optional, Set, Tuple, Union
+
+import httpx
+from pydantic import Field, root_validator
+
+from .abc import BaseModel
+
+Methods = Literal["GET", "POST", "PATCH", "PUT", "DELETE", "HEAD", "OPTIONS"]
+
+
+class Latency(BaseModel):
+    """応答までの待ち時間（秒）の分布です。"""
+
+    distribution: Literal["constant", "uniform", "exponential", "normal"] = "constant"
+    value: float = Field(0, ge=0, description="constantの待ち時間です。")
+    min: float = Field(0, ge=0, description="uniformの最小値です。")
+    max: float = Field(0, ge=0, description="uniformの最大値です。")
+    mean: float = Field(0, ge=0, description="exponential, normalの平均です。")
+    stddev: float = Field(
+        0, ge=0, description="normalの標準偏差です。負の値は0になります。"
+    )
+
+    def compile(self, rng: random.Random) -> Union[Callable[[], float], None]:
+        """待ち時間を返す関数を返す。待ち時間が常に0の場合はNoneを返す。"""
+        if self.distribution == "constant":
+            value = self.value
+            return (lambda: value) if value else None
+        elif self.distribution == "uniform":
+            return lambda: rng.uniform(self.min, self.max)
+        elif self.distribution == "exponential":
+            if not self.mean:
+                return None
+            rate = 1 / self.mean
+            return lambda: rng.expovariate(rate)
+        else:
+            return lambda: max(rng.gauss(self.mean, self.stddev), 0)
+
+
+class StubRoute(BaseModel):
+    path: str = Field(
+        ..., description="/users/{id}のように、{}でパスパラメータを指定できます。"
+    )
+    method: Union[Methods, List[Methods]] = "GET"
+    status_code: int = 200
+    headers: Dict[str, str] = {}
+    json_: Any = Field(
+        None,
+        alias="json",
+        description="文字列中の{name}はパスパラメータで置き換えられます。",
+    )
+    text: Union[str, None] = Field(
+        None,
+        description="{name}はパスパラメータで置き換えられます。識別子を囲まない{}はそのまま出力されます。",
+    )
+    latency: Union[Latency, float] = 0
+
+    @root_validator
+    def exclusive_body(cls, values):
+        if values.get("json_") is not None and values.get("text") is not None:
+            raise ValueError("json and text cannot be combined.")
+        return values
+
+    def get_methods(self) -> List[str]:
+        return [self.method] if isinstance(self.method, str) else list(self.method)
+
+    def get_path_params(self) -> Set[str]:
+        return {
+            x[1:-1]
+            for x in RouteTrie.split(self.path)
+            if x.startswith("{") and x.endswith("}")
+        }
+
+
+# 識別子を囲む{}だけをパスパラメータとして扱い、それ以外の{}は文字として残す
+PLACEHOLDER = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+
+class _Template:
+    """パスパラメータを埋め込む文字列です。解析はルートのコンパイル時に一度だけ行う。"""
+
+    __slots__ = ("parts",)
+
+    def __init__(self, parts: List[str]):
+        # 偶数番目は文字列、奇数番目はパスパラメータの名前
+        self.parts = parts
+
+    def render(self, params: Dict[str, str]) -> str:
+        return "".join(params[x] if i % 2 else x for i, x in enumerate(self.parts))
+
+
+def _compile(obj, names: Set[str]):
+    """本文の文字列をテンプレートに変換する。パスに存在しないパラメータはValueErrorとなる。"""
+    if isinstance(obj, str):
+        parts = PLACEHOLDER.split(obj)
+        if len(parts) == 1:
+            return obj
+        unknown = set(parts[1::2]) - names
+        if unknown:
+            raise ValueError(f"unknown path parameters: {sorted(unknown)} in {obj!r}")
+        return _Template(parts)
+    elif isinstance(obj, dict):
+        return {_compile(k, names): _compile(v, names) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [_compile(x, names) for x in obj]
+    return obj
+
+
+def _has_template(obj) -> bool:
+    if isinstance(obj, _Template):
+        return True
+    elif isinstance(obj, dict):
+        return any(_has_template(k) or _has_template(v) for k, v in obj.items())
+    elif isinstance(obj, list):
+        return any(_has_template(x) for x in obj)
+    return False
+
+
+def _render(obj, params: Dict[str, str]):
+    if isinstance(obj, _Template):
+        return obj.render(params)
+    elif isinstance(obj, dict):
+        return {_render(k, params): _render(v, params) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [_render(x, params) for x in obj]
+    return obj
+
+
+class CompiledRoute:
+    __slots__ = ("status_code", "headers", "body", "render", "latency")
+
+    def __init__(self, route: StubRoute, rng: random.Random):
+        if route.text is not None:
+            template: Any = route.text
+            media_type = "text/plain; charset=utf-8"
+            encode = lambda x: x.encode()
+        else:
+            template = route.json_
+            media_type = "application/json"
+            encode = lambda x: json.dumps(x, ensure_ascii=False).encode()
+
+        template = _compile(template, route.get_path_params())
+        headers = {"content-type": media_type, **route.headers}
+        self.status_code = route.status_code
+        self.headers = [(k.encode(), v.encode()) for k, v in headers.items()]
+        self.latency = (
+            Latency(value=route.latency)
+            if isinstance(route.latency, (int, float))
+            else route.latency
+        ).compile(rng)
+
+        # テンプレートを含まない本文は、一度だけ作成しておく
+        if _has_template(template):
+            self.body = None
+            self.render = lambda params: encode(_render(template, params))
+        else:
+            self.body = encode(template)
+            self.render = None
+
+    def get_body(self, params: Dict[str, str]) -> bytes:
+        if self.render is None:
+            return self.body
+        return self.render(params)
+
+
+class _Node:
+    __slots__ = ("children", "param_name", "param_child", "methods")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.param_name: Optional[str] = None
+        self.param_child: Optional["_Node"] = None
+        self.methods: Dict[str, CompiledRoute] = {}
+
+
+class RouteTrie:
+    """パスのセグメントごとに分岐するトライ木です。
+
+    照合はパスの長さに比例し、ルートの数には依存しない。固定のセグメントはパスパラメータより優先される。
+    """
+
+    def __init__(self):
+        self.root = _Node()
+
+    @staticmethod
+    def split(path: str) -> List[str]:
+        return path.strip("/").split("/")
+
+    def add(self, path: str, method: str, route: CompiledRoute):
+        node = self.root
+        for segment in self.split(path):
+            if segment.startswith("{") and segment.endswith("}"):
+                name = segment[1:-1]
+                if node.param_child is None:
+                    node.param_child = _Node()
+                    node.param_name = name
+                elif node.param_name != name:
+                    raise ValueError(
+                        f"conflicting path parameters: {{{node.param_name}}} and {segment} in {path}"
+                    )
+                node = node.param_child
+            else:
+                node = node.children.setdefault(segment, _Node())
+
+        if method in node.methods:
+            raise ValueError(f"duplicate route: {method} {path}")
+        node.methods[method] = route
+
+    def match(self, path: str) -> Union[Tuple[_Node, Dict[str, str]], None]:
+        segments = self.split(path)
+        params: Dict[str, str] = {}
+        node = self._match(self.root, segments, 0, params)
+        if node is None:
+            return None
+        return node, params
+
+    def _match(self, node: _Node, segments: List[str], index: int, params: dict):
+        if index == len(segments):
+            return node if node.methods else None
+
+        segment = segments[index]
+        child = node.children.get(segment, None)
+        if child is not None:
+            found = self._match(child, segments, index + 1, params)
+            if found is not None:
+                return found
+
+        if node.param_child is not None and segment:
+            params[node.param_name] = segment  # type: ignore
+            found = self._match(node.param_child, segments, index + 1, params)
+            if found is not None:
+                return found
+            del params[node.param_name]  # type: ignore
+
+        return None
+
+
+NOT_FOUND = (404, [(b"content-type", b"application/json")], b'{"detail":"Not Found"}')
+METHOD_NOT_ALLOWED = (
+    405,
+    [(b"content-type", b"application/json")],
+    b'{"detail":"Method Not Allowed"}',
+)
+
+
+class StubTransport(httpx.AsyncBaseTransport):
+    """定義したルートに従って、ネットワークやアプリケーションを介さずに応答するトランスポートです。
+
+    ランナー自体の性能測定や、高速なCIに利用します。
+    ルートはトライ木にコンパイルされるため、ルートの数が多くても照合の速度は変わりません。
+    seedを指定すると、待ち時間の分布が再現可能になります。
+    """
+
+    def __init__(self, routes: List[Union[StubRoute, dict]], seed: int = None):
+        rng = random.Random(seed)
+        self.routes = [
+            x if isinstance(x, StubRoute) else StubRoute.parse_obj(x) for x in routes
+        ]
+        self.trie = RouteTrie()
+        for route in self.routes:
+            compiled = CompiledRoute(route, rng)
+            for method in route.get_methods():
+                self.trie.add(route.path, method, compiled)
+
+    async def handle_async_request(self, method, url, headers, stream, extensions):
+        path = url[3].partition(b"?")[0].decode("latin-1")
+        matched = self.trie.match(path)
+        if matched is None:
+            status_code, res_headers, body = NOT_FOUND
+        else:
+            node, params = matched
+            route = node.methods.get(method.decode("ascii"), None)
+            if route is None:
+                status_code, res_headers, body = METHOD_NOT_ALLOWED
+            else:
+                if route.latency is not None:
+                    await asyncio.sleep(route.latency())
+                status_code = route.status_code
+                res_headers = route.headers
+                body = route.get_body(params)
+
+        return status_code, res_headers, httpx.ByteStream(body), {}
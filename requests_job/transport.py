@@ -1,7 +1,14 @@
-from typing import Callable, Optional, Tuple, Union
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from weakref import WeakKeyDictionary
 
 import httpx
-from asgi_lifespan import LifespanManager as _LifespanManager
+from asgi_lifespan import LifespanManager
 from pydantic import validate_arguments
 
 from .values import AttrPath
@@ -9,21 +16,68 @@ from .values import AttrPath
 unfefined = object()
 
 
-class LifespanManager(_LifespanManager):
-    manager = set()  # type: ignore
+class LifespanRegistry:
+    """アプリケーションごとにlifespanを一つだけ起動し、参照カウントで共有する。
 
-    async def __aenter__(self):
-        if self.app in self.manager:
-            raise RuntimeError("Application is already running")
-        self.manager.add(self.app)
-        return await super().__aenter__()
+    最初の参照でstartupを、最後の参照が解放された時点でshutdownを実行する。
+    keep_alive()の範囲内では、参照が無くなってもshutdownをその範囲の終了まで遅らせる。
+    lifespanはイベントループに紐づくため、レジストリはイベントループごとに作成される。
+    """
 
-    async def __aexit__(self, exc_type, exc, tb):
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # key -> [非同期コンテキストマネージャ, 参照数]
+        self.entries: Dict[Any, list] = {}
+        self.keep_alive_count = 0
+
+    async def acquire(self, key, factory: Callable[[], Any]):
+        """keyに対応するlifespanを返す。起動していない場合はfactoryで作成して起動する。"""
+        async with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is None:
+                lifespan = factory()
+                await lifespan.__aenter__()
+                entry = self.entries[key] = [lifespan, 0]
+            entry[1] += 1
+            return entry[0]
+
+    async def release(self, key):
+        async with self.lock:
+            entry = self.entries[key]
+            entry[1] -= 1
+            if entry[1] == 0 and not self.keep_alive_count:
+                del self.entries[key]
+                await entry[0].__aexit__(None, None, None)
+
+    @asynccontextmanager
+    async def keep_alive(self):
+        self.keep_alive_count += 1
         try:
-            self.manager.remove(self.app)
-        except:
-            pass
-        return await super().__aexit__(exc_type, exc, tb)
+            yield self
+        finally:
+            self.keep_alive_count -= 1
+            if not self.keep_alive_count:
+                await self._shutdown_unused()
+
+    async def _shutdown_unused(self):
+        async with self.lock:
+            unused = [k for k, v in self.entries.items() if v[1] == 0]
+            for key in unused:
+                lifespan, _ = self.entries.pop(key)
+                await lifespan.__aexit__(None, None, None)
+
+
+# イベントループ -> LifespanRegistry
+_lifespan_registries: WeakKeyDictionary = WeakKeyDictionary()
+
+
+def get_lifespan_registry() -> LifespanRegistry:
+    """実行中のイベントループのLifespanRegistryを返す。"""
+    loop = asyncio.get_running_loop()
+    registry = _lifespan_registries.get(loop, None)
+    if registry is None:
+        registry = _lifespan_registries[loop] = LifespanRegistry()
+    return registry
 
 
 class ASGITransportLifespan(httpx.ASGITransport):
@@ -73,22 +127,22 @@ class ASGITransportLifespan(httpx.ASGITransport):
         if self.lifespan:
             raise RuntimeError("Application is already running")
 
-        lifespan = LifespanManager(
+        # 同じアプリケーションを使う他のトランスポートとlifespanを共有する
+        self.lifespan = await get_lifespan_registry().acquire(
             self.app,
-            startup_timeout=self.startup_timeout,
-            shutdown_timeout=self.shutdown_timeout,
+            lambda: LifespanManager(
+                self.app,
+                startup_timeout=self.startup_timeout,
+                shutdown_timeout=self.shutdown_timeout,
+            ),
         )
-
-        await lifespan.__aenter__()
-        self.lifespan = lifespan
         await super().__aenter__()
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
-        lifespan = self.lifespan
         self.lifespan = None  # type: ignore
         try:
-            await lifespan.__aexit__(exc_type, exc, tb)
+            await get_lifespan_registry().release(self.app)
         finally:
             pass
 
@@ -98,3 +152,161 @@ class ASGITransportLifespan(httpx.ASGITransport):
         if self.lifespan is None:
             raise RuntimeError("app is not running.")
         return await super().handle_async_request(*args, **kwargs)
+
+
+class ASGIProcessServer:
+    """ASGIアプリケーションをworkers個のuvicornプロセスで起動し、UNIXドメインソケットで待ち受ける。
+
+    ソケットはこのプロセスで作成し、各ワーカーに引き継ぐ。接続はカーネルによってワーカーに振り分けられる。
+    """
+
+    def __init__(
+        self,
+        app: str,
+        workers: int = 1,
+        startup_timeout: Optional[float] = 60 * 5,
+        shutdown_timeout: Optional[float] = 60 * 10,
+    ):
+        self.app = app
+        self.workers = workers
+        self.startup_timeout = startup_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self.tmpdir: Optional[tempfile.TemporaryDirectory] = None
+        self.socket: Optional[socket.socket] = None
+        self.processes: List[asyncio.subprocess.Process] = []
+
+    @property
+    def uds(self) -> str:
+        return os.path.join(self.tmpdir.name, "app.sock")  # type: ignore
+
+    async def __aenter__(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.bind(self.uds)
+        self.socket.listen(2048)
+        fd = self.socket.fileno()
+
+        # 子プロセスからも同じモジュールをimportできるようにする
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            [os.getcwd()] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+        )
+        try:
+            for _ in range(self.workers):
+                process = await asyncio.create_subprocess_exec(
+                    sys.executable,
+                    "-m",
+                    "uvicorn",
+                    self.app,
+                    "--fd",
+                    str(fd),
+                    "--lifespan",
+                    "on",
+                    "--log-level",
+                    "warning",
+                    env=env,
+                    pass_fds=(fd,),
+                )
+                self.processes.append(process)
+            await asyncio.wait_for(self._wait_ready(), self.startup_timeout)
+        except BaseException:
+            await self.__aexit__(None, None, None)
+            raise
+        return self
+
+    async def _wait_ready(self):
+        # startupが完了し、リクエストに応答するまで待つ
+        transport = httpx.AsyncHTTPTransport(uds=self.uds)
+        async with httpx.AsyncClient(transport=transport) as client:
+            while True:
+                if any(x.returncode is not None for x in self.processes):
+                    raise RuntimeError(f"{self.app} exited while starting up.")
+                try:
+                    await client.get("http://localhost/")
+                    return
+                except httpx.TransportError:
+                    await asyncio.sleep(0.05)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        processes, self.processes = self.processes, []
+        try:
+            # SIGTERMを受けたワーカーはshutdownを実行してから終了する
+            for process in processes:
+                if process.returncode is None:
+                    process.terminate()
+            for process in processes:
+                try:
+                    await asyncio.wait_for(process.wait(), self.shutdown_timeout)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+        finally:
+            if self.socket is not None:
+                self.socket.close()
+                self.socket = None
+            if self.tmpdir is not None:
+                self.tmpdir.cleanup()
+                self.tmpdir = None
+
+
+class ASGIProcessTransport(httpx.AsyncBaseTransport):
+    """AttrPathで指定したASGIアプリケーションを、workers個のプロセスで起動して送信するトランスポートです。
+
+    ASGITransportLifespanと異なり、アプリケーションはランナーと別のプロセスで動作するため、
+    アプリケーションの複数コアでのスループットを測定できます。通信はUNIXドメインソケットで行います。
+    同じアプリケーションとワーカー数のトランスポートは、起動したプロセスを共有します。
+    uvicornが必要です。
+    """
+
+    def __init__(
+        self,
+        app: str,
+        workers: int = 1,
+        startup_timeout: Optional[float] = 60 * 5,
+        shutdown_timeout: Optional[float] = 60 * 10,
+        **kwargs,
+    ):
+        AttrPath(app)
+        self.app = app
+        self.workers = workers
+        self.startup_timeout = startup_timeout
+        self.shutdown_timeout = shutdown_timeout
+        # httpx.AsyncHTTPTransportに渡す引数
+        self.kwargs = kwargs
+        self.server: Optional[ASGIProcessServer] = None
+        self.transport: Optional[httpx.AsyncHTTPTransport] = None
+
+    @property
+    def key(self):
+        return (ASGIProcessServer, self.app, self.workers)
+
+    async def __aenter__(self):
+        if self.server:
+            raise RuntimeError("Application is already running")
+
+        self.server = await get_lifespan_registry().acquire(
+            self.key,
+            lambda: ASGIProcessServer(
+                self.app,
+                workers=self.workers,
+                startup_timeout=self.startup_timeout,
+                shutdown_timeout=self.shutdown_timeout,
+            ),
+        )
+        self.transport = httpx.AsyncHTTPTransport(uds=self.server.uds, **self.kwargs)
+        await self.transport.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        transport, self.transport = self.transport, None
+        self.server = None
+        try:
+            if transport is not None:
+                await transport.__aexit__(exc_type, exc, tb)
+        finally:
+            await get_lifespan_registry().release(self.key)
+
+    async def handle_async_request(self, *args, **kwargs):
+        if self.transport is None:
+            raise RuntimeError("app is not running.")
+        return await self.transport.handle_async_request(*args, **kwargs)
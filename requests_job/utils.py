@@ -20,6 +20,21 @@ def urljoin(base, url, allow_fragments=True):
     return url
 
 
+def run_sync(coro):
+    """コルーチンを同期的に実行する。実行中のイベントループ内から呼ばれた場合は、別スレッドのイベントループで実行する。"""
+    import asyncio
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
 def normalize(obj1: Union[dict, None], obj2: Union[dict, None]):
     """"""
     if obj1 is None and not obj2:
@@ -72,7 +87,7 @@ def merge_objects(
             for key in obj2.keys():
                 obj2_val = obj2[key]
 
-                if not key in obj1:
+                if not key in obj1 or obj1[key] is None:
                     obj1[key] = obj2_val
                 else:
                     if isinstance(obj2_val, (list, set, dict)):
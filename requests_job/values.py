@@ -1,4 +1,7 @@
+import re
+from functools import lru_cache
 from pathlib import Path
+from string import Formatter
 from typing import (
     Any,
     ClassVar,
@@ -12,10 +15,19 @@ from typing import (
     no_type_check,
 )
 
-from pydantic import BaseModel, Field, FilePath, HttpUrl, PrivateAttr, validator
+from pydantic import (
+    AnyHttpUrl,
+    BaseModel,
+    Field,
+    FilePath,
+    PrivateAttr,
+    StrictBool,
+    validator,
+)
 from pydantic.generics import GenericModel
 from requests.auth import HTTPBasicAuth, HTTPDigestAuth, HTTPProxyAuth
 
+from .multipart import FilePart, UrlPart
 from .types import undefined
 
 HTTP_BASIC_AUTH = "HTTPBasicAuth"
@@ -105,12 +117,66 @@ class AttrInfo(BaseModel):
             raise ValueError(f"{self.module_name}:{self.attr_name} - " + err)
 
 
+class AttrCache:
+    """module:attrの解決結果を、プロセス全体で共有するキャッシュです。
+
+    解決に失敗した結果は、後からモジュールが作成される場合に備えてキャッシュしない。
+    モジュールを再読み込みした場合は、clear()でキャッシュを破棄してください。
+    破棄するたびにgenerationが進み、各AttrPathが保持している解決結果も無効になる。
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, AttrInfo] = {}
+        self.generation = 0
+
+    def get(self, path: str) -> Union[AttrInfo, None]:
+        return self.entries.get(path, None)
+
+    def put(self, path: str, info: AttrInfo):
+        self.entries[path] = info
+
+    def clear(self, module_name: str = None):
+        """キャッシュを破棄する。module_nameを指定した場合は、そのモジュールとサブモジュールのみ破棄する。"""
+        if module_name is None:
+            self.entries.clear()
+        else:
+            prefix = module_name + "."
+            for path, info in list(self.entries.items()):
+                if info.module_name == module_name or info.module_name.startswith(
+                    prefix
+                ):
+                    self.entries.pop(path, None)
+        self.generation += 1
+
+
+attr_cache = AttrCache()
+
+
 class AttrPath(ValueObject[str]):
-    """<module or package>:<attr>"""
+    """<module or package>:<attr>
+
+    解決した属性はプロセス全体のキャッシュと、インスタンス自身に保持される。
+    """
+
+    _info: Optional[AttrInfo] = PrivateAttr(None)
+    _generation: int = PrivateAttr(-1)
 
     @property
     def value(self):
-        return self.get_module_attr(self.__root__)
+        if self._info is None or self._generation != attr_cache.generation:
+            self._generation = attr_cache.generation
+            self._info = self.get_module_attr(self.__root__)
+        return self._info
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        # モジュールはpickleできないため、解決結果を保存しない
+        state["__private_attribute_values__"] = {"_info": None, "_generation": -1}
+        return state
+
+    @classmethod
+    def clear_cache(cls, module_name: str = None):
+        attr_cache.clear(module_name)
 
     @classmethod
     def check(cls, v: str):
@@ -125,6 +191,11 @@ class AttrPath(ValueObject[str]):
 
     @classmethod
     def get_module_attr(cls, v):
+        if isinstance(v, str):
+            info = attr_cache.get(v)
+            if info is not None:
+                return info
+
         module_name, attr_name = cls.split_module_attr(v)
 
         from importlib import import_module
@@ -143,6 +214,7 @@ class AttrPath(ValueObject[str]):
             module_name=module_name, module=module, attr_name=attr_name, attr=attr
         )
         result.raise_if_not_valid()
+        attr_cache.put(v, result)
         return result
 
     @classmethod
@@ -163,37 +235,117 @@ class AttrPath(ValueObject[str]):
         return module_name, attr_name
 
 
+FIELD_NAME = re.compile(r"([^.\[\]]+)(?:\.[^.\[\]]+|\[[^\[\]]+\])*")
+
+
+class FStringTemplate:
+    """string.Formatter().parseで一度だけ解析した、str.format形式のテンプレートです。
+
+    {{と}}のエスケープ、変換（!r）、書式指定（:05d）、属性やインデックスの参照（{a.b}, {a[0]}）に対応する。
+    位置引数（{}, {0}）と不正なテンプレートは、解析時にValueErrorとなる。
+    """
+
+    __slots__ = ("source", "keywords", "text")
+
+    def __init__(self, source: str):
+        keywords = set()
+        literals = []
+        for literal, field_name, format_spec, conversion in Formatter().parse(source):
+            literals.append(literal)
+            if field_name is None:
+                continue
+
+            matched = FIELD_NAME.fullmatch(field_name)
+            if not matched or matched.group(1).isdigit():
+                raise ValueError(
+                    f"positional or invalid field is not supported: '{{{field_name}}}' in {source}"
+                )
+            if conversion not in (None, "r", "s", "a"):
+                raise ValueError(f"unknown conversion: '!{conversion}' in {source}")
+
+            keywords.add(matched.group(1))
+            # 書式指定の中のフィールド（{x:{width}}）も解析する
+            if format_spec:
+                keywords |= compile_template(format_spec).keywords
+
+        self.source = source
+        self.keywords = frozenset(keywords)
+        # キーワードが無い場合は、エスケープを解除した文字列を保持しておく
+        self.text = None if keywords else "".join(literals)
+
+    def render(self, kwargs: Dict[str, Any]) -> str:
+        """テンプレートに値を埋め込む。足りないキーワードがある場合はValueErrorとなる。"""
+        if self.text is not None:
+            return self.text
+
+        try:
+            return self.source.format_map(kwargs)
+        except KeyError:
+            required = {k for k in self.keywords if k not in kwargs}
+            if required:
+                raise ValueError(f"required kwargs: {required}") from None
+            raise
+
+    def __reduce__(self):
+        return (compile_template, (self.source,))
+
+
+@lru_cache(maxsize=1024)
+def compile_template(source: str) -> FStringTemplate:
+    return FStringTemplate(source)
+
+
 class FString(ValueObject[str]):
-    _keywords: set = PrivateAttr(set())
+    _template: FStringTemplate = PrivateAttr(None)
 
     def __post_init__(self):
-        self._keywords = self._extract_keywords(self.__root__)
+        self._template = compile_template(self.__root__)
+
+    @classmethod
+    def check(cls, v: str):
+        compile_template(v)
+
+    @classmethod
+    def literal(cls, text: str) -> "FString":
+        """展開済みの文字列を、テンプレートとして再解釈しないFStringとして返す。
+
+        {と}はそのままの文字として扱われ、キーワードを持たない。
+        """
+        obj = cls.construct(__root__=text)
+        obj._template = compile_template(text.replace("{", "{{").replace("}", "}}"))
+        return obj
+
+    @property
+    def template(self) -> FStringTemplate:
+        if self._template is None:
+            self._template = compile_template(self.__root__)
+        return self._template
 
     @property
     def keywords(self):
-        return self._keywords
+        return self.template.keywords
 
     def pull_kwargs(self, kwargs: dict):
         """対象の辞書から有効なキーのみ取り出す。"""
         if kwargs is None:
             return {}
-        return {k: v for k, v in kwargs.items()}
+        keywords = self.keywords
+        return {k: v for k, v in kwargs.items() if k in keywords}
 
     def format(self, **kwargs):
         """str.formatの結果を返す。f-stringに渡すキーワード引数が足りない場合は例外が発生する。認識しないキーワード引数は無視される。"""
-        try:
-            result = self.__root__.format(**kwargs)
-        except KeyError as e:
-            required = {k for k in self.keywords if k not in kwargs}
-            raise ValueError(f"required kwargs: {required}")
-        return result
+        return self.template.render(kwargs)
+
+    def format_map(self, kwargs: Dict[str, Any]):
+        """formatと同じ結果を、辞書を展開せずに返す。"""
+        return self.template.render(kwargs)
 
     def format_as(self, kwargs: dict, default=None, ignore_extra=True):
         dic = self._create_kwargs(kwargs, default=default, ignore_extra=ignore_extra)
         return self.format(**dic)
 
     def _create_kwargs(self, kwargs: dict, default=None, ignore_extra=True):
-        dic = {x: default for x in self._keywords}
+        dic = {x: default for x in self.keywords}
         if ignore_extra:
             includes = {k: v for k, v in kwargs.items() if k in dic}
         else:
@@ -201,18 +353,6 @@ class FString(ValueObject[str]):
         dic.update(includes)
         return dic
 
-    @staticmethod
-    def _extract_keywords(s: str):
-        import re
-
-        res = re.findall(r"\{.*?\}", s)
-        keywords = set()
-        for x in res:
-            a = x.replace("{", "")
-            b = a.replace("}", "")
-            keywords.add(b)
-        return keywords
-
 
 class Instance(BaseModel):
     type: Union[Alias, AttrPath]
@@ -245,7 +385,8 @@ class Transport(Instance):
 
 
 class Verify(BaseModel):
-    __root__: Union[str, bool, Instance] = True
+    # strを先に評価するとboolが"True"に変換されてしまう
+    __root__: Union[StrictBool, str, Instance] = True
 
     def __init__(self, __root__):
         super().__init__(__root__=__root__)
@@ -254,7 +395,7 @@ class Verify(BaseModel):
         if isinstance(self.__root__, (str, bool)):
             return self.__root__
         elif isinstance(self.__root__, Instance):
-            return self.get_value(context=context)
+            return self.__root__.get_value(context=context)
         else:
             raise TypeError()
 
@@ -262,15 +403,19 @@ class Verify(BaseModel):
 class File(BaseModel):
     key: str
     name: Optional[str] = None
-    path: FilePath
+    path: Union[AnyHttpUrl, FilePath] = Field(
+        ..., description="URLを指定した場合は、ダウンロードしながらそのままアップロードします。"
+    )
     media_type: Optional[str] = None
     exist: bool = Field(True, description="ファイルが途中で作成される場合など、事前検証を無効化できます")
+    transport: Optional[Transport] = Field(
+        None, description="URLからダウンロードする際に使うトランスポートです。省略した場合はジョブのクライアントの設定でダウンロードします。"
+    )
 
     @validator("path")
     def exists_file(cls, v, values):
-        if isinstance(v, HttpUrl):
-            # web上のファイルを落として、そのままアップロードできればいいなぁ
-            raise NotImplementedError()
+        if isinstance(v, AnyHttpUrl):
+            return v
         elif isinstance(v, Path):
             pass
         else:
@@ -282,17 +427,11 @@ class File(BaseModel):
         return v
 
     def get_value(self, context=None):
-        builder = [self.key]
-
-        if self.name is not None:
-            builder.append(self.name)
-
-        builder.append(open(self.path, "rb"))  # type: ignore
-
-        if self.media_type is not None:
-            builder.append(self.media_type)
-
-        return tuple(builder)
+        # ファイルは送信時に開かれる
+        if isinstance(self.path, AnyHttpUrl):
+            transport = self.transport.get_value() if self.transport else None
+            return UrlPart(self.key, self.path, self.name, self.media_type, transport)
+        return FilePart(self.key, self.path, self.name, self.media_type)
 
 
 class MultiFile(BaseModel):
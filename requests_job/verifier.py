@@ -1,9 +1,9 @@
 from itertools import chain
-from json.decoder import JSONDecodeError
 from typing import List
 
 from httpx import Response
 
+from . import spool
 from .exceptions import (
     AppException,
     FailJSONDecode,
@@ -12,6 +12,7 @@ from .exceptions import (
     ValidationError,
     ValueMismatch,
 )
+from .streaming import BodyAccumulator
 from .types import undefined
 
 # class Undefined:
@@ -133,7 +134,7 @@ def is_same_type(actual, expect):
 class GetterBase:
     def __init_subclass__(cls, **kwargs):
         attrs = [x for x in dir(cls) if x.startswith("get_")]
-        names = {x.lstrip("get_"): x for x in attrs}
+        names = {x[len("get_") :]: x for x in attrs}
         functions = {k: getattr(cls, v) for k, v in names.items()}
         cls.getters = functions  # type: ignore
 
@@ -159,10 +160,11 @@ class Getter(GetterBase):
     @staticmethod
     def get_json(res):
         try:
-            value = res.json()
-        except JSONDecodeError as e:
-            value = FailJSONDecode.create(str(e), doc=res.text)
-            return value
+            value = spool.get_json(res)
+        # JSONDecodeErrorに加えて、一時ファイルの本文を解析した場合のValueErrorを含む
+        except ValueError as e:
+            value = FailJSONDecode.create(str(e), doc=spool.get_text(res))
+        return value
 
     @staticmethod
     def get_headers(res):
@@ -193,11 +195,14 @@ class Getter(GetterBase):
 
     @staticmethod
     def get_content(res):
-        return res.content
+        body = spool.get_spool(res)
+        if body is None:
+            return res.content
+        return body.view()
 
     @staticmethod
     def get_text(res):
-        return res.text
+        return spool.get_text(res)
 
     @staticmethod
     def get_encoding(res):
@@ -268,12 +273,60 @@ class Verifier:
         self.expect = expect
 
     def __call__(self, res: Response):
-        expect = self.expect
-        actual = Getter.create_actual(res, self.expect)
+        actual = self.__getter__.create_actual(res, self.expect)
+        return self.verify(actual)
 
+    def verify(self, actual: dict) -> List[Exception]:
         errors: List[Exception] = []
-        for err in compare(actual, expect, "response"):
+        for err in compare(actual, self.expect, "response"):
             errors.append(err)
 
+        self.report(errors)
+        return errors
+
+    def report(self, errors: List[Exception]):
         for err in errors:
             print(f"{err.__class__.__name__}: {err}")
+
+
+class StreamVerifier(Verifier):
+    """レスポンスの本文をメモリに保持せずに、受信しながら検証する。
+
+    本文からはsize, sha256, lines, jsonを検証できる。jsonは期待値に含まれるパスの値だけを取り出す。
+    NDJSONの本文は1つのJSON文書ではないため、jsonは検証できない。
+    """
+
+    body_keys = {"size", "sha256", "lines", "json"}
+    unsupported_keys = {"content", "text"}
+    ndjson_types = {
+        "application/x-ndjson",
+        "application/ndjson",
+        "application/jsonl",
+        "application/x-jsonlines",
+    }
+
+    async def __call__(self, res: Response):
+        expect = self.expect
+        content_type = res.headers.get("Content-Type", "").split(";")[0].strip()
+        is_ndjson = content_type.lower() in self.ndjson_types
+        body = BodyAccumulator(
+            undefined if is_ndjson else expect.get("json", undefined)
+        )
+        async for chunk in res.aiter_bytes():
+            body.feed(chunk)
+
+        excludes = self.body_keys | self.unsupported_keys
+        meta = {k: v for k, v in expect.items() if k not in excludes}
+        actual = self.__getter__.create_actual(res, meta)
+        result = body.result()
+        for key in expect:
+            if key == "json" and is_ndjson:
+                actual[key] = ValidationError(
+                    f"json is not available for {content_type}. use lines instead."
+                )
+            elif key in self.body_keys:
+                actual[key] = result[key]
+            elif key in self.unsupported_keys:
+                actual[key] = ValidationError(f"{key} is not available in stream mode.")
+
+        return self.verify(actual)
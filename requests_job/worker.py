@@ -1,7 +1,13 @@
-from . import verifier
-from .client import AsyncClientWrapper
+from typing import IO, List, Union
+
+from . import load, scheduler
+from .client import AsyncClientWrapper, TransportRegistry
+from .exceptions import InvalidRowError, JobError, ParametrizeError
 from .parser import Parser
+from .plan import JobPlan, TaskPlan, compile_job
 from .schemas import Job, Profile
+from .transport import get_lifespan_registry
+from .utils import run_sync
 
 
 class Token:
@@ -9,6 +15,19 @@ class Token:
         self.is_cancelled = False
 
 
+class JobResult:
+    def __init__(self, name: str, exception: Union[BaseException, None] = None):
+        self.name = name
+        self.exception = exception
+
+    @property
+    def is_success(self):
+        return self.exception is None
+
+    def __repr__(self):
+        return f"JobResult(name={self.name!r}, exception={self.exception!r})"
+
+
 class HttpxJob:
     parser = Parser
     __schema__ = Profile
@@ -24,6 +43,16 @@ class HttpxJob:
         dic = cls.parser.parse_file(path=path)
         return cls.parse_dict(dic)
 
+    @classmethod
+    def parse_file_cached(cls, path: str, cache_dir: str = None):
+        """検証済みのプロファイルをキャッシュから読み込む。内容が変わっていない場合はYAMLの解析と検証を省略する。"""
+        from .cache import ProfileCache
+
+        profile = ProfileCache(cache_dir).load_file(
+            path, lambda content: cls.parse_str(content).profile
+        )
+        return cls(profile)
+
     @classmethod
     def parse_str(cls, content: str):
         dic = cls.parser.parse_str(content=content)
@@ -36,31 +65,216 @@ class HttpxJob:
         profile = cls.__schema__(**profile)
         return cls(profile)
 
-    def run(self, token=None):
+    def run(self, token=None, concurrency: int = None, parallel_jobs: int = None):
+        return run_sync(
+            self.arun(token, concurrency=concurrency, parallel_jobs=parallel_jobs)
+        )
+
+    async def arun(
+        self, token=None, concurrency: int = None, parallel_jobs: int = None
+    ) -> List[JobResult]:
+        """全てのジョブを一つのイベントループ上で実行する。
+
+        最大parallel_jobs個のジョブを並行して実行する。
+        失敗したジョブは他のジョブを中断せず、全てのジョブの終了後にJobErrorを送出する。
+        fail_fastが有効な場合は、実行中のジョブをキャンセルして直ちに例外を送出する。
+        """
         token = token or Token()
-        for job in self.profile.jobs:
-            self.execute_job(job, token)
+        profile = self.profile
+        parallel_jobs = parallel_jobs or profile.parallel_jobs
+        results: List[JobResult] = []
 
-    @classmethod
-    def execute_job(cls, job: Job, token):
-        import asyncio
+        async def execute(job: JobPlan):
+            if parallel_jobs == 1:
+                callback = print
+            else:
+
+                def callback(result):
+                    print(f"{job.name}: {result}")
+
+            try:
+                await self.execute(
+                    job,
+                    token,
+                    concurrency=concurrency,
+                    callback=callback,
+                    registry=registry,
+                )
+            except Exception as e:
+                if profile.fail_fast:
+                    raise
+                return JobResult(job.name, e)
+            return JobResult(job.name)
+
+        # 接続設定が同じジョブ間でコネクションプールを共有する
+        # ASGIアプリケーションのlifespanは、全てのジョブが終わるまで維持する
+        lifespans = get_lifespan_registry()
+        async with lifespans.keep_alive(), TransportRegistry() as registry:
+            await scheduler.bounded_map(
+                execute,
+                profile.get_plan().jobs,
+                parallel_jobs,
+                token,
+                callback=results.append,
+            )
+
+        failed = [x for x in results if not x.is_success]
+        if failed:
+            raise JobError(results) from failed[0].exception
+
+        return results
 
-        asyncio.run(cls.execute(job, token))
+    def get_job(self, name: str = None) -> Job:
+        """継承を解決したジョブを返す。nameを省略した場合は最初のジョブを返す。"""
+        jobs = self.profile.get_plan().jobs
+        if name is None:
+            if jobs:
+                return jobs[0].job
+            return Job(name="feed").merge_parent(self.profile)
+
+        for plan in jobs:
+            if plan.name == name:
+                return plan.job
+        raise ValueError(f"job not found: {name}")
+
+    def run_feed(
+        self,
+        input: IO[str],
+        output: IO[str],
+        job: str = None,
+        token=None,
+        concurrency: int = None,
+        ordered: bool = True,
+        batch_size: int = 1000,
+        include_body: bool = False,
+    ):
+        return run_sync(
+            self.arun_feed(
+                input,
+                output,
+                job=job,
+                token=token,
+                concurrency=concurrency,
+                ordered=ordered,
+                batch_size=batch_size,
+                include_body=include_body,
+            )
+        )
+
+    async def arun_feed(
+        self,
+        input: IO[str],
+        output: IO[str],
+        job: str = None,
+        token=None,
+        concurrency: int = None,
+        ordered: bool = True,
+        batch_size: int = 1000,
+        include_body: bool = False,
+    ) -> dict:
+        """JSONLのリクエストフィードを、jobの設定で送信し、結果をJSONLでoutputに書き出す。
+
+        inputはスレッドでbatch_size行ずつ読み込まれ、検証される。
+        送信中と出力待ちの行数には上限があるため、フィードの大きさに関わらずメモリの使用量は一定です。
+        送信した行数とエラーになった行数を返す。
+        """
+        from .feed import aread_feed, dump_result, run_feed
+
+        token = token or Token()
+        counts = {"total": 0, "errors": 0}
+
+        def write(result: dict):
+            counts["total"] += 1
+            if "error" in result:
+                counts["errors"] += 1
+            output.write(dump_result(result))
+
+        lifespans = get_lifespan_registry()
+        async with lifespans.keep_alive(), TransportRegistry() as registry:
+            await run_feed(
+                self.get_job(job),
+                aread_feed(input, batch_size),
+                write,
+                token,
+                concurrency=concurrency,
+                ordered=ordered,
+                include_body=include_body,
+                registry=registry,
+            )
+        output.flush()
+        return counts
 
     @classmethod
-    async def execute(cls, job: Job, token):
+    def execute_job(cls, job: Union[Job, JobPlan], token, concurrency: int = None):
+        return run_sync(cls.execute(job, token, concurrency=concurrency))
+
+    @classmethod
+    async def execute(
+        cls,
+        job: Union[Job, JobPlan],
+        token,
+        concurrency: int = None,
+        callback=print,
+        registry: TransportRegistry = None,
+    ):
+        """ジョブのタスクを最大concurrency個まで並行して実行する。
+
+        depends_onが定義されている場合は、依存先のタスクが完了したものから実行する。
+        結果はタスクの定義順に出力される。
+        parametrizeの行を適用できない場合は、その行を失敗として出力して残りの行を送信し、
+        ジョブの終了後にParametrizeErrorを送出する。
+        loadが定義されている場合は負荷試験として実行し、ステージごとの集計結果と
+        ウォームアップを除いた全体の集計結果のみを出力する。
+        """
+        plan = job if isinstance(job, JobPlan) else compile_job(job)
+        job = plan.job
         client_args = job.build_client_args()
         event_hooks = client_args.pop("event_hooks", {})
+        concurrency = concurrency or job.concurrency
+
+        async with AsyncClientWrapper(registry, **client_args) as client:
 
-        async with AsyncClientWrapper(**client_args) as client:
-            for task in job.tasks:
-                if token.is_cancelled:
-                    break
+            invalid_rows: List[InvalidRowError] = []
 
+            async def send(task: TaskPlan):
                 request_args = task.build_request_args()
-                event_hooks = request_args.pop("event_hooks", {"expect": []})
+                return await client.request(task.pipeline, **request_args)
+
+            async def send_or_report(task: TaskPlan):
+                # 不正な行はジョブを中断せずに出力し、ジョブの終了後にまとめて送出する
+                if task.error is not None:
+                    invalid_rows.append(task.error)
+                    return task.error
+                return await send(task)
+
+            tasks = plan.iter_tasks()
+
+            if job.load is not None:
+                stages = job.load.get_stages()
+                results = await load.run_stages(
+                    send, tasks, stages, job.load.max_outstanding, token
+                )
+                if job.load.stages:
+                    for stats in results:
+                        callback(stats)
+
+                measured = (x for x, y in zip(results, stages) if not y.warmup)
+                callback(load.LoadStats.combine(job.name, measured))
+                return
 
-                checker = verifier.Verifier(task.expect or {})
-                event_hooks["expect"].append(checker)
-                result = await client.request(event_hooks, **request_args)
-                print(result)
+            dependencies = plan.dependencies
+            if dependencies is None:
+                await scheduler.bounded_map(
+                    send_or_report, tasks, concurrency, token, callback=callback
+                )
+                if invalid_rows:
+                    raise ParametrizeError(invalid_rows)
+            else:
+                await scheduler.run_graph(
+                    send,
+                    plan.tasks,
+                    dependencies,
+                    concurrency,
+                    token,
+                    callback=callback,
+                )
@@ -1,6 +1,8 @@
-from .loader import LoaderBase, constructor
+from .loader import CLoaderBase, LoaderBase, LoaderMixin, constructor
 
 __all__ = [
+    "CLoaderBase",
     "LoaderBase",
+    "LoaderMixin",
     "constructor",
 ]
@@ -49,14 +49,23 @@ def extract_constructors(cls):
     return funcs
 
 
-class LoaderBase(yaml.Loader):
+class LoaderMixin:
+    """カスタムのconstructorとimplicit resolverを、サブクラスの定義時に登録する。
+
+    基底となるローダー（__base_loader__が真のクラス）には登録しない。
+    """
+
     Dumper = None
     RESOLVERS: Dict[str, re.Pattern] = {}
+    __dumper__: type = yaml.Dumper
 
     def __init_subclass__(cls) -> None:
+        if cls.__dict__.get("__base_loader__", False):
+            return
+
         if cls.Dumper is None:
 
-            class Dumper(yaml.Dumper):
+            class Dumper(cls.__dumper__):  # type: ignore
                 pass
 
             cls.Dumper = Dumper
@@ -73,3 +82,20 @@ class LoaderBase(yaml.Loader):
         funcs = extract_constructors(cls)
         for tag, func in funcs.items():
             yaml.add_constructor(tag=tag, constructor=func, Loader=cls)
+
+
+class LoaderBase(LoaderMixin, yaml.Loader):
+    __base_loader__ = True
+
+
+# libyamlが利用できる場合のみ、Cで実装されたパーサーを用いるローダーを提供する
+if getattr(yaml, "__with_libyaml__", False):
+
+    class CLoaderBase(LoaderMixin, yaml.CLoader):  # type: ignore
+        """libyamlで構文解析するローダーです。constructorとresolverはLoaderBaseと同じです。"""
+
+        __base_loader__ = True
+        __dumper__ = yaml.CDumper
+
+else:
+    CLoaderBase = None  # type: ignore
@@ -129,3 +129,34 @@ async def wait_request(wait: float = Body(0, embed=True)):
 @app.post("/yaml")
 async def post_yaml(*, body: str = Body(..., media_type="application/x-yaml")):
     return body
+
+
+@app.get("/export")
+async def export_records(count: int = 3):
+    from starlette.responses import StreamingResponse
+
+    async def generate():
+        yield b'{"count": %d, "items": [' % count
+        for i in range(count):
+            yield (b"," if i else b"") + b'{"id": %d, "name": "record_%d"}' % (i, i)
+        yield b'], "status": "ok"}\n'
+
+    return StreamingResponse(generate(), media_type="application/json")
+
+
+@app.get("/export/ndjson")
+async def export_ndjson(count: int = 3):
+    from starlette.responses import StreamingResponse
+
+    async def generate():
+        for i in range(count):
+            yield b'{"id": %d, "name": "record_%d"}\n' % (i, i)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@app.get("/pid")
+def get_pid():
+    import os
+
+    return os.getpid()
@@ -0,0 +1,14 @@
+from fastapi import FastAPI
+from starlette.responses import StreamingResponse
+
+# アップロード元として、別のサービスを模したアプリケーション
+app = FastAPI(debug=True)
+
+
+@app.get("/artifacts/{name}")
+async def download_artifact(name: str, count: int = 3):
+    async def generate():
+        for i in range(count):
+            yield f"{name}-{i};".encode()
+
+    return StreamingResponse(generate(), media_type="text/plain")
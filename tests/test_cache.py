@@ -0,0 +1,189 @@
+import os
+
+import pytest
+
+from requests_job import HttpxJob
+from requests_job.cache import ProfileCache, get_cache_key, get_module_names
+
+PROFILE = """
+base_url: http://testserver
+jobs:
+  - name: job_1
+    tasks:
+      - name: first
+        url: /get_record/1
+        event_hooks:
+          request:
+            - {module}:on_request
+"""
+
+
+def prepare(tmp_path, monkeypatch, module):
+    (tmp_path / f"{module}.py").write_text("async def on_request(request):\n    pass\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    path = tmp_path / "profile.yaml"
+    path.write_text(PROFILE.format(module=module))
+    return str(path), tmp_path / "cache"
+
+
+def count_parse(monkeypatch):
+    calls = []
+    parse_str = HttpxJob.parse_str.__func__
+
+    def wrapper(cls, content):
+        calls.append(content)
+        return parse_str(cls, content)
+
+    monkeypatch.setattr(HttpxJob, "parse_str", classmethod(wrapper))
+    return calls
+
+
+def test_cache_hit(tmp_path, monkeypatch):
+    path, cache_dir = prepare(tmp_path, monkeypatch, "cache_hooks_1")
+    calls = count_parse(monkeypatch)
+
+    job = HttpxJob.parse_file_cached(path, cache_dir=cache_dir)
+    assert len(calls) == 1
+    assert len(list(cache_dir.glob("*.pickle"))) == 1
+    assert get_module_names(job.profile) == {"cache_hooks_1"}
+
+    cached = HttpxJob.parse_file_cached(path, cache_dir=cache_dir)
+    assert len(calls) == 1
+    assert cached.profile == job.profile
+    # 実行計画もキャッシュから復元される
+    assert cached.profile._plan is not None
+    task = cached.profile.get_plan().jobs[0].tasks[0]
+    assert task.build_request_args()["url"] == "/get_record/1"
+
+
+def test_cache_invalidation(tmp_path, monkeypatch):
+    path, cache_dir = prepare(tmp_path, monkeypatch, "cache_hooks_2")
+    calls = count_parse(monkeypatch)
+
+    HttpxJob.parse_file_cached(path, cache_dir=cache_dir)
+    assert len(calls) == 1
+
+    # プロファイルの内容が変わった
+    with open(path, "a") as f:
+        f.write("      - name: second\n        url: /get_record/2\n")
+    job = HttpxJob.parse_file_cached(path, cache_dir=cache_dir)
+    assert len(calls) == 2
+    assert len(job.profile.nodes[0].nodes) == 2
+
+    # フックのモジュールが更新された
+    hooks = tmp_path / "cache_hooks_2.py"
+    stat = hooks.stat()
+    os.utime(hooks, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    HttpxJob.parse_file_cached(path, cache_dir=cache_dir)
+    assert len(calls) == 3
+
+    HttpxJob.parse_file_cached(path, cache_dir=cache_dir)
+    assert len(calls) == 3
+
+
+def test_cache_broken(tmp_path, monkeypatch):
+    path, cache_dir = prepare(tmp_path, monkeypatch, "cache_hooks_3")
+    calls = count_parse(monkeypatch)
+
+    HttpxJob.parse_file_cached(path, cache_dir=cache_dir)
+    for file in cache_dir.glob("*.pickle"):
+        file.write_bytes(b"broken")
+
+    job = HttpxJob.parse_file_cached(path, cache_dir=cache_dir)
+    assert len(calls) == 2
+    assert job.profile.nodes[0].name == "job_1"
+    assert ProfileCache(cache_dir).load_file(path, None) == job.profile
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX only")
+def test_cache_untrusted(tmp_path, monkeypatch):
+    path, cache_dir = prepare(tmp_path, monkeypatch, "cache_hooks_4")
+    calls = count_parse(monkeypatch)
+
+    HttpxJob.parse_file_cached(path, cache_dir=cache_dir)
+    assert cache_dir.stat().st_mode & 0o777 == 0o700
+
+    # 他のユーザーが書き込めるキャッシュは読み込まない
+    for file in cache_dir.glob("*.pickle"):
+        file.chmod(0o666)
+    HttpxJob.parse_file_cached(path, cache_dir=cache_dir)
+    assert len(calls) == 2
+
+    # 他のユーザーが所有するキャッシュは読み込まない
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(path).st_uid + 1)
+    HttpxJob.parse_file_cached(path, cache_dir=cache_dir)
+    assert len(calls) == 3
+
+
+def test_cache_key(tmp_path, monkeypatch):
+    path, cache_dir = prepare(tmp_path, monkeypatch, "cache_hooks_5")
+    calls = count_parse(monkeypatch)
+
+    # 相対パスはカレントディレクトリを基準に検証されるため、別のキャッシュになる
+    HttpxJob.parse_file_cached(path, cache_dir=cache_dir)
+    monkeypatch.chdir(tmp_path)
+    HttpxJob.parse_file_cached(path, cache_dir=cache_dir)
+    assert len(calls) == 2
+    assert get_cache_key(b"") != get_cache_key(b" ")
+
+
+def test_cache_package_modules(tmp_path, monkeypatch):
+    package = tmp_path / "cache_hooks_6"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "util.py").write_text("VALUE = 1\n")
+    (package / "hooks.py").write_text(
+        "from .util import VALUE\n\nasync def on_request(request):\n    pass\n"
+    )
+    path, cache_dir = prepare(tmp_path, monkeypatch, "cache_hooks_6.hooks")
+    calls = count_parse(monkeypatch)
+
+    HttpxJob.parse_file_cached(path, cache_dir=cache_dir)
+    assert len(calls) == 1
+
+    # フックがimportしている同じパッケージのモジュールが更新された
+    util = package / "util.py"
+    stat = util.stat()
+    os.utime(util, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    HttpxJob.parse_file_cached(path, cache_dir=cache_dir)
+    assert len(calls) == 2
+
+
+def test_cache_unpicklable(tmp_path, monkeypatch):
+    (tmp_path / "cache_hooks_7.py").write_text(
+        "import threading\n"
+        "\n"
+        "on_request = lambda request: None\n"
+        "\n"
+        "\n"
+        "class LockedAuth:\n"
+        "    def __init__(self, token):\n"
+        "        self.token = token\n"
+        "        self.lock = threading.Lock()\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    cache_dir = tmp_path / "cache"
+
+    # ラムダのフックはpickleできないため、キャッシュせずにそのまま返す
+    path = tmp_path / "hook.yaml"
+    path.write_text(PROFILE.format(module="cache_hooks_7"))
+    with pytest.warns(RuntimeWarning, match="not cached"):
+        job = HttpxJob.parse_file_cached(str(path), cache_dir=cache_dir)
+    assert job.profile.nodes[0].name == "job_1"
+    assert list(cache_dir.iterdir()) == []
+
+    # authのインスタンスは保存せず、復元時に作り直す
+    path = tmp_path / "auth.yaml"
+    path.write_text(
+        "base_url: http://testserver\n"
+        "jobs:\n"
+        "  - name: job_1\n"
+        "    tasks:\n"
+        "      - url: /get_record/1\n"
+        "        auth: {type: 'cache_hooks_7:LockedAuth', args: [secret]}\n"
+    )
+    HttpxJob.parse_file_cached(str(path), cache_dir=cache_dir)
+    cached = HttpxJob.parse_file_cached(str(path), cache_dir=cache_dir)
+    assert len(list(cache_dir.glob("*.pickle"))) == 1
+    auth = cached.profile.get_plan().jobs[0].tasks[0].build_request_args()["auth"]
+    assert auth.token == "secret"
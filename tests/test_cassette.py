@@ -0,0 +1,99 @@
+import importlib
+
+import pytest
+
+from requests_job import HttpxJob
+from requests_job.cassette import normalize_body, request_key
+from requests_job.exceptions import CassetteNotFound, JobError
+
+
+def test_request_key():
+    url = (b"http", b"testserver", None, b"/path?b=2&a=1")
+    key = request_key(b"GET", url, b"")
+    assert key == request_key(
+        b"get", (b"http", b"TESTSERVER", None, b"/path?a=1&b=2"), b""
+    )
+    assert key != request_key(b"GET", url, b"body")
+    assert key != request_key(b"POST", url, b"")
+
+    headers = [(b"Content-Type", b'multipart/form-data; boundary="abc"')]
+    assert normalize_body(headers, b"--abc\r\nx\r\n--abc--\r\n") == (
+        b"--boundary\r\nx\r\n--boundary--\r\n"
+    )
+    assert normalize_body([(b"content-type", b"text/plain")], b"--abc") == b"--abc"
+
+
+def create_profile(path, mode):
+    cassette = {"path": str(path), "mode": mode}
+    if mode != "replay":
+        cassette["transport"] = {
+            "type": "requests_job:ASGITransportLifespan",
+            "kwargs": {"app": "tests.mock:app"},
+        }
+    return HttpxJob.parse_dict(
+        {
+            "transport": {
+                "type": "requests_job:CassetteTransport",
+                "kwargs": cassette,
+            },
+            "base_url": "http://testserver",
+            "jobs": [
+                {
+                    "name": "cassette",
+                    "tasks": [
+                        {
+                            "url": "/export?count=2",
+                            "expect": {
+                                "status_code": 200,
+                                "json": {"count": 2, "status": "ok"},
+                            },
+                        },
+                        {
+                            "url": "/wait",
+                            "method": "post",
+                            "json": {"wait": 0},
+                            "expect": {"status_code": 200, "json": None},
+                        },
+                        {
+                            # マルチパートの境界は送信ごとに変わる
+                            "url": "/file/upload_multiple",
+                            "method": "post",
+                            "files": [
+                                {
+                                    "key": "files",
+                                    "path": "tests/mock/files/sample_1.txt",
+                                }
+                            ],
+                            "expect": {"status_code": 200},
+                        },
+                    ],
+                }
+            ],
+        }
+    )
+
+
+def test_record_and_replay(tmp_path, capsys):
+    app = importlib.import_module("tests.mock.app")
+    path = tmp_path / "cassette.db"
+
+    app.clear_count()
+    create_profile(path, "record").run()
+    assert app.count_startup == 1
+
+    app.clear_count()
+    create_profile(path, "replay").run()
+    create_profile(path, "auto").run()
+    assert "Mismatch" not in capsys.readouterr().out
+    # 記録済みのレスポンスを返すため、アプリケーションは起動されない
+    assert app.count_startup == 0
+
+
+def test_replay_not_found(tmp_path):
+    job = create_profile(tmp_path / "empty.db", "replay")
+    with pytest.raises(JobError) as e:
+        job.run()
+
+    cause = e.value.__cause__
+    assert isinstance(cause, CassetteNotFound)
+    assert str(cause) == "no recorded response: GET http://testserver/export?count=2"
@@ -0,0 +1,199 @@
+import httpx
+import pytest
+
+from requests_job.client import AsyncClientWrapper, TransportRegistry
+
+
+@pytest.mark.asyncio
+async def test_transport_registry(monkeypatch):
+    created = []
+    create_ssl_context = httpx.create_ssl_context
+
+    def counter(*args, **kwargs):
+        created.append(kwargs)
+        return create_ssl_context(*args, **kwargs)
+
+    monkeypatch.setattr(httpx, "create_ssl_context", counter)
+
+    async with TransportRegistry() as registry:
+        a = await registry.acquire()
+        b = await registry.acquire()
+        c = await registry.acquire(limits=httpx.Limits(max_connections=1))
+        assert a is b
+        assert a["transport"].transport is not c["transport"].transport
+        # SSLコンテキストはverify, cert, trust_envの組み合わせごとに一度だけ作成される
+        assert len(created) == 1
+
+        async with AsyncClientWrapper(registry) as client_1:
+            async with AsyncClientWrapper(registry, headers={"a": "1"}) as client_2:
+                assert client_1.client._transport is a["transport"]
+                assert client_2.client._transport is a["transport"]
+                assert client_1.client.cookies is not client_2.client.cookies
+
+    assert registry.transports == {}
+
+
+@pytest.mark.asyncio
+async def test_client_wrapper_without_registry():
+    async with AsyncClientWrapper(verify=False) as wrapper:
+        assert isinstance(wrapper.client._transport.transport, httpx.AsyncHTTPTransport)
+
+    with pytest.raises(RuntimeError, match="Client not created"):
+        await wrapper.request()
+
+
+@pytest.mark.asyncio
+async def test_hook_pipeline():
+    from requests_job.client import HookPipeline
+    from requests_job.eventhooks import debug_response
+    from requests_job.schemas import Task
+    from requests_job.verifier import Verifier
+
+    task = Task(
+        url="http://testserver/",
+        event_hooks={"response": ["requests_job.eventhooks:debug_response"]},
+        expect={"status_code": 200},
+    )
+    pipeline = task.compile_hooks()
+    assert isinstance(pipeline, HookPipeline)
+    assert pipeline.response == (debug_response,)
+    assert isinstance(pipeline.expect[0], Verifier)
+
+    called = []
+    pipeline = pipeline._replace(request=(called.append,))
+    transport = httpx.MockTransport(lambda request: httpx.Response(200))
+    async with AsyncClientWrapper(transport=transport) as client:
+        args = task.build_request_args(include_event_hooks=False)
+        response = await client.request(pipeline, **args)
+        response = await client.request(pipeline, **args)
+
+    assert response.status_code == 200
+    assert len(called) == 2
+
+
+def blocking_hook(arg):
+    import time
+
+    time.sleep(0.1)
+    return arg
+
+
+@pytest.mark.asyncio
+async def test_hook_policy():
+    import asyncio
+    import time
+
+    from requests_job.client import wrap_hook
+
+    assert wrap_hook(blocking_hook, "inline") is blocking_hook
+
+    # スレッドプールで実行されるため、イベントループを止めない
+    hook = wrap_hook(blocking_hook, "thread")
+    start = time.perf_counter()
+    assert await asyncio.gather(hook(1), hook(2)) == [1, 2]
+    assert time.perf_counter() - start < 0.2
+
+    hook = wrap_hook(str, "process")
+    assert await hook(1) == "1"
+
+    with pytest.raises(ValueError, match="unknown policy"):
+        wrap_hook(str, "unknown")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_hooks():
+    import asyncio
+    import time
+
+    from requests_job.schemas import Task
+
+    task = Task(
+        url="http://testserver/",
+        event_hooks={
+            "request": [
+                {"func": "tests.test_client:blocking_hook", "policy": "thread"}
+            ],
+            "complete": [
+                {"func": "tests.test_client:blocking_hook", "policy": "thread"},
+                {"func": "tests.test_client:blocking_hook", "policy": "thread"},
+            ],
+            "concurrent": ["complete"],
+        },
+    )
+    pipeline = task.compile_hooks()
+    assert pipeline.concurrent == {"complete"}
+
+    transport = httpx.MockTransport(lambda request: httpx.Response(200))
+    async with AsyncClientWrapper(transport=transport) as client:
+        args = task.build_request_args(include_event_hooks=False)
+        start = time.perf_counter()
+        await client.request(pipeline, **args)
+        assert time.perf_counter() - start < 0.25
+
+
+@pytest.mark.asyncio
+async def test_process_hook_pool():
+    import multiprocessing
+
+    from pydantic import ValidationError
+
+    from requests_job.client import PolicyHook
+    from requests_job.schemas import Task
+
+    task = Task(
+        url="http://testserver/",
+        event_hooks={
+            "success": [
+                {"func": "tests.test_client:blocking_hook", "policy": "process"}
+            ]
+        },
+    )
+    pipeline = task.compile_hooks()
+    assert isinstance(pipeline.success[0], PolicyHook)
+    children = set(multiprocessing.active_children())
+
+    transport = httpx.MockTransport(lambda request: httpx.Response(200))
+    async with TransportRegistry() as registry:
+        async with AsyncClientWrapper(registry, transport=transport) as client:
+            args = task.build_request_args(include_event_hooks=False)
+            await client.request(pipeline, **args)
+        assert registry.process_pool.executor is not None
+
+    # プロセスプールはレジストリと共に終了する
+    assert registry.process_pool.executor is None
+    assert set(multiprocessing.active_children()) <= children
+
+    # リクエストやレスポンスを書き換えるフックは、プロセスで実行できない
+    for event in ["build_request", "request", "response"]:
+        with pytest.raises(ValidationError, match="process policy is not supported"):
+            Task(
+                event_hooks={
+                    event: [
+                        {"func": "tests.test_client:blocking_hook", "policy": "process"}
+                    ]
+                }
+            )
+
+
+@pytest.mark.asyncio
+async def test_asgi_process_transport():
+    import os
+
+    from requests_job import ASGIProcessTransport
+    from requests_job.transport import get_lifespan_registry
+
+    transports = [ASGIProcessTransport("tests.mock:app", workers=2) for _ in range(2)]
+    clients = [
+        AsyncClientWrapper(transport=x, base_url="http://testserver")
+        for x in transports
+    ]
+    pids = []
+    async with clients[0], clients[1]:
+        # 同じアプリケーションとワーカー数のプロセスは共有される
+        assert transports[0].server is transports[1].server
+        for client in clients:
+            res = await client.request(method="GET", url="/pid")
+            pids.append(res.json())
+
+    assert os.getpid() not in pids
+    assert get_lifespan_registry().entries == {}
@@ -0,0 +1,144 @@
+import io
+import json
+import os
+import threading
+
+from typer.testing import CliRunner
+
+from requests_job import HttpxJob
+from requests_job.__main__ import app
+from requests_job.feed import FeedError, FeedRequest, read_feed
+
+PROFILE = {
+    "base_url": "http://stub",
+    "headers": {"x-profile": "1"},
+    "transport": {
+        "type": "requests_job:StubTransport",
+        "kwargs": {
+            "routes": [
+                {"path": "/users/{id}", "json": {"id": "{id}"}},
+                {"path": "/slow", "latency": 0.1, "text": "slow"},
+            ]
+        },
+    },
+    "jobs": [{"name": "feed", "concurrency": 4}],
+}
+
+
+def create_feed(*lines):
+    return io.StringIO("".join(json.dumps(x) + "\n" for x in lines))
+
+
+def test_read_feed():
+    file = io.StringIO(
+        '{"url": "/users/1", "id": "a"}\n\n[1]\n{"method": "x"}\nbroken\n'
+    )
+    items = list(read_feed(file, batch_size=2))
+    assert len(items) == 4
+    assert isinstance(items[0], FeedRequest)
+    assert items[0].id == "a"
+    assert [type(x) for x in items[1:]] == [FeedError] * 3
+
+    # 読み込みは必要な行数までしか進まない
+    file = create_feed(*({"url": f"/users/{i}"} for i in range(10)))
+    items = read_feed(file, batch_size=3)
+    next(items)
+    assert file.tell() < len(file.getvalue())
+
+
+def test_read_feed_pipe():
+    from concurrent.futures import ThreadPoolExecutor
+
+    fd_in, fd_out = os.pipe()
+    with open(fd_in) as reader, open(fd_out, "w") as writer:
+        writer.write('{"url": "/users/1"}\n{"url": "/users/2"}\n')
+        writer.flush()
+        items = read_feed(reader, batch_size=1000)
+        # 次の行が届いていない場合は、batch_sizeに満たなくても先に返す
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            try:
+                first = executor.submit(next, items).result(timeout=5)
+                assert first.url.__root__ == "/users/1"
+                assert next(items).url.__root__ == "/users/2"
+            finally:
+                writer.close()
+
+
+def run_feed(feed, **kwargs):
+    job = HttpxJob.parse_dict(PROFILE)
+    output = io.StringIO()
+    counts = job.run_feed(feed, output, **kwargs)
+    results = [json.loads(x) for x in output.getvalue().splitlines()]
+    return counts, results
+
+
+def test_feed_order():
+    lines = [{"url": "/slow", "id": "slow"}] + [
+        {"url": f"/users/{i}", "params": {"q": i}} for i in range(5)
+    ]
+
+    counts, results = run_feed(create_feed(*lines), include_body=True)
+    assert counts == {"total": 6, "errors": 0}
+    assert [x["index"] for x in results] == list(range(6))
+    assert results[0]["id"] == "slow"
+    assert results[0]["body"] == "slow"
+    assert results[1]["status_code"] == 200
+    assert json.loads(results[1]["body"]) == {"id": "0"}
+
+    counts, results = run_feed(create_feed(*lines), ordered=False)
+    assert results[-1]["index"] == 0
+    assert "body" not in results[-1]
+
+
+def test_feed_slow_input():
+    written = threading.Event()
+
+    class SlowInput:
+        def __iter__(self):
+            yield json.dumps({"url": "/slow"}) + "\n"
+            # 最初の結果が出力されるまで次の行を届けない
+            assert written.wait(5), "the event loop is blocked by reading"
+            yield json.dumps({"url": "/users/2"}) + "\n"
+
+    class Output(io.StringIO):
+        def write(self, s):
+            written.set()
+            return super().write(s)
+
+    job = HttpxJob.parse_dict(PROFILE)
+    output = Output()
+    counts = job.run_feed(SlowInput(), output, batch_size=1)  # type: ignore
+    assert counts == {"total": 2, "errors": 0}
+
+
+def test_feed_errors():
+    feed = create_feed(
+        {"url": "/users/1", "expect": {"status_code": 404}},
+        {"url": "/unknown"},
+        {"url": "/users/1", "depends_on": ["a"]},
+        {"url": "/users/1"},
+    )
+    counts, results = run_feed(feed, concurrency=1)
+    assert counts == {"total": 4, "errors": 2}
+    assert results[0]["error"].startswith("ExpectationError")
+    assert results[1]["status_code"] == 404
+    assert "depends_on is not supported" in results[2]["error"]
+    assert results[3]["status_code"] == 200
+
+
+def test_feed_cli(tmp_path):
+    profile = tmp_path / "profile.json"
+    profile.write_text(json.dumps(PROFILE))
+    feed = tmp_path / "feed.jsonl"
+    feed.write_text(
+        "".join(json.dumps({"url": f"/users/{i}"}) + "\n" for i in range(3))
+    )
+    output = tmp_path / "results.jsonl"
+
+    result = CliRunner().invoke(
+        app,
+        [str(profile), "--feed", str(feed), "--output", str(output), "--job", "feed"],
+    )
+    assert result.exit_code == 0, result.output
+    results = [json.loads(x) for x in output.read_text().splitlines()]
+    assert [x["status_code"] for x in results] == [200, 200, 200]
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from requests_job.load import (
+    LoadStats,
+    constant_arrivals,
+    generate_load,
+    ramp_arrivals,
+    run_stages,
+)
+from requests_job.schemas import Load
+from requests_job.worker import Token
+
+
+def test_constant_arrivals():
+    assert list(constant_arrivals(4, 1)) == [0, 0.25, 0.5, 0.75]
+
+
+def test_ramp_arrivals():
+    # 0 -> 4 rps over 2s: cumulative arrivals = t^2
+    assert list(ramp_arrivals(0, 4, 2)) == [
+        0,
+        1,
+        pytest.approx(2**0.5),
+        pytest.approx(3**0.5),
+    ]
+    assert len(list(ramp_arrivals(100, 0, 1))) == 50
+
+
+def test_stats():
+    stats = LoadStats("stats")
+    for i in range(1, 101):
+        stats.record(i / 1000, is_error=i > 90)
+
+    assert stats.completed == 100
+    assert stats.errors == 10
+    assert stats.percentile(50) == 0.05
+    assert stats.percentile(99) == 0.099
+    assert stats.summary()["max"] == 0.1
+
+
+@pytest.mark.asyncio
+async def test_generate_load():
+    async def send(request):
+        await asyncio.sleep(0.05)
+        return request
+
+    stats = LoadStats()
+    arrivals = ((x, stats) for x in constant_arrivals(100, 0.1))
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await generate_load(send, ["a", "b"], arrivals, 1000, Token())
+    assert stats.sent == 10
+    assert stats.completed == 10
+    assert stats.dropped == 0
+    # 応答を待たずに送信するため、全体の所要時間はおおよそduration + レイテンシになる
+    assert loop.time() - start < 0.1 + 0.05 * 3
+
+
+@pytest.mark.asyncio
+async def test_generate_load_max_outstanding():
+    async def send(request):
+        await asyncio.sleep(1)
+
+    stats = LoadStats()
+    arrivals = ((x, stats) for x in constant_arrivals(100, 0.05))
+    await generate_load(send, ["a"], arrivals, 2, Token())
+    assert stats.sent == 2
+    assert stats.dropped == 3
+
+
+def test_load_schema():
+    from pydantic import ValidationError
+
+    with pytest.raises(ValidationError, match="required"):
+        Load(rate=1)
+
+    with pytest.raises(ValidationError, match="cannot be combined"):
+        Load(rate=1, duration=1, stages=[{"duration": 1, "target": 1}])
+
+    load = Load(
+        stages=[
+            {"duration": 60, "target": 500, "warmup": True},
+            {"duration": 600, "target": 500},
+            {"name": "spike", "duration": 30, "start": 2000, "target": 2000},
+            {"duration": 60, "target": 0},
+        ]
+    )
+    stages = [(x.name, x.start, x.target) for x in load.get_stages()]
+    assert stages == [
+        ("stage_0", 0, 500),
+        ("stage_1", 500, 500),
+        ("spike", 2000, 2000),
+        ("stage_3", 2000, 0),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_run_stages():
+    async def send(request):
+        return request
+
+    load = Load(
+        stages=[
+            {"duration": 0.1, "target": 100, "warmup": True},
+            {"duration": 0.1, "target": 100},
+        ]
+    )
+    results = await run_stages(send, ["a"], load.get_stages(), 100, Token())
+    assert [x.sent for x in results] == [5, 10]
+    assert [x.throughput for x in results] == [50, 100]
+
+
+def test_load_job(capsys):
+    from requests_job import HttpxJob
+
+    profile = {
+        "transport": {
+            "type": "requests_job:ASGITransportLifespan",
+            "kwargs": {"app": "tests.mock:app"},
+        },
+        "base_url": "http://testserver",
+        "load": {"rate": 50, "duration": 0.2},
+        "jobs": [{"name": "load", "tasks": [{"url": "/get_record/1"}]}],
+    }
+    HttpxJob.parse_dict(profile).run()
+    out = capsys.readouterr().out
+    assert "name=load sent=10 completed=10 errors=0 dropped=0" in out
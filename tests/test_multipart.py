@@ -0,0 +1,239 @@
+import os
+
+import httpx
+import pytest
+
+from requests_job.multipart import FilePart, MultipartStream
+
+
+def count_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def create_stream(chunk_size=4):
+    files = [
+        FilePart("files", "tests/mock/files/sample_1.txt", chunk_size=chunk_size),
+        FilePart("files", "tests/mock/files/sample_2.txt", chunk_size=chunk_size),
+    ]
+    return MultipartStream({"message": "hello"}, files, boundary=b"boundary")
+
+
+@pytest.mark.asyncio
+async def test_multipart_stream():
+    stream = create_stream()
+    body = b"".join([x async for x in stream])
+
+    assert body == (
+        b"--boundary\r\n"
+        b'Content-Disposition: form-data; name="message"\r\n\r\n'
+        b"hello\r\n"
+        b"--boundary\r\n"
+        b'Content-Disposition: form-data; name="files"; filename="sample_1.txt"\r\n'
+        b"Content-Type: text/plain\r\n\r\n"
+        b"this is sample 1.\r\n"
+        b"--boundary\r\n"
+        b'Content-Disposition: form-data; name="files"; filename="sample_2.txt"\r\n'
+        b"Content-Type: text/plain\r\n\r\n"
+        b"this is sample 2.\r\n"
+        b"--boundary--\r\n"
+    )
+    assert stream.get_headers() == {
+        "Content-Type": "multipart/form-data; boundary=boundary",
+        "Content-Length": str(len(body)),
+    }
+
+
+@pytest.mark.asyncio
+async def test_multipart_stream_aclose():
+    before = count_fds()
+    stream = create_stream()
+    iterator = stream.__aiter__()
+    for _ in range(7):
+        await iterator.__anext__()
+
+    # 読み込み中のファイルが開かれている
+    assert count_fds() == before + 1
+    await stream.aclose()
+    assert count_fds() == before
+
+
+def test_upload_files(capsys):
+    from requests_job import HttpxJob
+
+    files = [
+        {"key": "files", "path": "tests/mock/files/sample_1.txt"},
+        {"key": "files", "path": "tests/mock/files/sample_2.txt"},
+    ]
+    job = HttpxJob.parse_dict(
+        {
+            "transport": {
+                "type": "requests_job:ASGITransportLifespan",
+                "kwargs": {"app": "tests.mock:app"},
+            },
+            "base_url": "http://testserver",
+            "jobs": [
+                {
+                    "name": "upload",
+                    "concurrency": 5,
+                    "tasks": [
+                        {
+                            "url": "/file/upload_multiple",
+                            "method": "post",
+                            "files": files,
+                            "expect": {
+                                "status_code": 200,
+                                "json": [
+                                    {
+                                        "name": "sample_1.txt",
+                                        "content": "this is sample 1.",
+                                    },
+                                    {
+                                        "name": "sample_2.txt",
+                                        "content": "this is sample 2.",
+                                    },
+                                ],
+                            },
+                        }
+                    ]
+                    * 20,
+                }
+            ],
+        }
+    )
+
+    task = next(job.profile.jobs).nodes[0]
+    # リクエストを組み立てた時点ではファイルを開かない
+    before = count_fds()
+    args = task.build_request_args()
+    assert count_fds() == before
+    assert isinstance(args["content"], MultipartStream)
+
+    job.run()
+    assert count_fds() == before
+    assert "Mismatch" not in capsys.readouterr().out
+
+
+def create_upload_from_url(url):
+    from requests_job import HttpxJob
+
+    file = {
+        "key": "files",
+        "path": url,
+        "transport": {
+            "type": "requests_job:ASGITransportLifespan",
+            "kwargs": {"app": "tests.mock.source:app"},
+        },
+    }
+    return HttpxJob.parse_dict(
+        {
+            "transport": {
+                "type": "requests_job:ASGITransportLifespan",
+                "kwargs": {"app": "tests.mock:app"},
+            },
+            "base_url": "http://testserver",
+            "jobs": [
+                {
+                    "name": "copy",
+                    "tasks": [
+                        {
+                            "url": "/file/upload_multiple",
+                            "method": "post",
+                            "files": [file],
+                            "expect": {
+                                "status_code": 200,
+                                "json": [
+                                    {
+                                        "name": "build.txt",
+                                        "content": "build.txt-0;build.txt-1;",
+                                    }
+                                ],
+                            },
+                        }
+                    ],
+                }
+            ],
+        }
+    )
+
+
+def test_upload_from_url(capsys):
+    job = create_upload_from_url("http://source/artifacts/build.txt?count=2")
+    file = next(job.profile.jobs).nodes[0].files.__root__[0]
+    assert file.path.host == "source"
+
+    job.run()
+    assert "Mismatch" not in capsys.readouterr().out
+
+
+class CountingTransport(httpx.AsyncBaseTransport):
+    """本文を要求された分だけ生成し、生成したチャンクの数を数える。"""
+
+    def __init__(self, count: int, status_code: int = 200):
+        self.count = count
+        self.status_code = status_code
+        self.sent_chunks = 0
+
+    async def handle_async_request(self, method, url, headers, stream, extensions):
+        transport = self
+
+        class Stream(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                for i in range(transport.count):
+                    transport.sent_chunks += 1
+                    yield f"chunk-{i};".encode()
+
+        headers = [(b"content-type", b"text/plain")]
+        return self.status_code, headers, Stream(), {}
+
+
+@pytest.mark.asyncio
+async def test_url_part_backpressure():
+    from requests_job.multipart import UrlPart
+
+    transport = CountingTransport(100)
+    part = UrlPart("files", "http://source/artifacts/build.txt", transport=transport)
+    assert part.filename == "build.txt"
+    assert part.media_type == "text/plain"
+
+    iterator = part.iter_chunks()
+    assert await iterator.__anext__() == b"chunk-0;"
+    await iterator.aclose()
+    # 送信側が要求した分しかダウンロードしない
+    assert transport.sent_chunks == 1
+
+
+@pytest.mark.asyncio
+async def test_url_part_failed():
+    from requests_job.multipart import UrlPart
+
+    part = UrlPart(
+        "files", "http://source/missing", transport=CountingTransport(1, 404)
+    )
+    with pytest.raises(httpx.HTTPStatusError):
+        async for _ in part.iter_chunks():
+            pass
+
+
+@pytest.mark.asyncio
+async def test_url_part_job_client():
+    from requests_job.client import AsyncClientWrapper
+    from requests_job.multipart import MultipartStream, UrlPart
+
+    downloads = []
+
+    def handler(request: httpx.Request):
+        if request.method == "GET":
+            downloads.append(request)
+            return httpx.Response(200, content=b"data")
+        return httpx.Response(200, content=request.read())
+
+    # transportを指定しないURLは、ジョブのクライアントの設定でダウンロードする
+    stream = MultipartStream(files=[UrlPart("files", "http://source/a.txt")])
+    transport = httpx.MockTransport(handler)
+    async with AsyncClientWrapper(transport=transport, headers={"x-job": "1"}) as c:
+        response = await c.request(
+            method="POST", url="http://target/upload", content=stream
+        )
+
+    assert [x.headers["x-job"] for x in downloads] == ["1"]
+    assert b"data" in response.content
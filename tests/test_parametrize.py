@@ -0,0 +1,221 @@
+import itertools
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from requests_job import HttpxJob
+from requests_job.datasource import iter_rows
+from requests_job.exceptions import InvalidRowError, JobError
+from requests_job.plan import compile_job
+from requests_job.schemas import Job
+
+RECEIVED = []
+
+
+def record(request):
+    RECEIVED.append(str(request.url))
+
+
+def write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(x) + "\n" for x in rows))
+    return str(path)
+
+
+def test_iter_rows(tmp_path):
+    csv_path = tmp_path / "users.csv"
+    csv_path.write_text("id,name\n1,a\n2,b\n")
+    assert list(iter_rows(csv_path)) == [
+        {"id": "1", "name": "a"},
+        {"id": "2", "name": "b"},
+    ]
+
+    jsonl_path = tmp_path / "users.jsonl"
+    jsonl_path.write_text('{"id": 1}\n\n{"id": 2}\n[3]\n')
+    rows = iter_rows(jsonl_path)
+    assert next(rows) == {"id": 1}
+    assert next(rows) == {"id": 2}
+    with pytest.raises(ValueError, match="must be an object"):
+        next(rows)
+
+    with pytest.raises(ValueError, match="unknown data format"):
+        list(iter_rows(tmp_path / "users.txt"))
+
+
+def test_parametrize_expand(tmp_path):
+    source = write_jsonl(
+        tmp_path / "users.jsonl",
+        [{"id": 1, "name": "a"}, {"id": 2, "q": "override"}, "broken"],
+    )
+    job = Job(
+        name="job",
+        tasks=[
+            {"url": "/static"},
+            {
+                "url": "/users/{id}",
+                "kwargs": {"q": "default"},
+                "parametrize": {"source": source},
+            },
+            {
+                "url": "/users/{id}",
+                "method": "post",
+                "json": {"a": 1},
+                "parametrize": {"source": source, "extra": "json"},
+            },
+        ],
+    )
+    plan = compile_job(job)
+    assert len(plan.tasks) == 3
+
+    # 行は必要になった時点で読み込まれる
+    expanded = iter(plan.iter_tasks())
+    args = [x.build_request_args() for x in itertools.islice(expanded, 3)]
+    assert args[0]["url"] == "/static"
+    assert args[1]["url"] == "/users/1"
+    assert args[1]["params"] == {"q": "default", "name": "a"}
+    assert args[2]["url"] == "/users/2"
+    assert args[2]["params"] == {"q": "override"}
+    with pytest.raises(ValueError, match="must be an object"):
+        next(expanded)
+
+    # 反復するたびにデータソースを読み直す
+    write_jsonl(tmp_path / "users.jsonl", [{"id": 3, "name": "c"}])
+    args = [x.build_request_args() for x in plan.iter_tasks()]
+    assert [x["url"] for x in args] == ["/static", "/users/3", "/users/3"]
+    assert args[2]["json"] == {"a": 1, "name": "c"}
+    assert "params" not in args[2]
+
+    # 行にurlのキーワードが無い場合は、その行だけが失敗する
+    source = write_jsonl(tmp_path / "rows.jsonl", [{"id": 1}, {"name": "b"}, {"id": 3}])
+    job = Job(name="job", tasks=[{"url": "/{id}", "parametrize": {"source": source}}])
+    first, second, third = compile_job(job).iter_tasks()
+    assert third.build_request_args()["url"] == "/3"
+    assert isinstance(second.error, InvalidRowError)
+    assert second.error.index == 1
+    with pytest.raises(InvalidRowError, match="required kwargs"):
+        second.build_request_args()
+
+
+def test_parametrize_validation(tmp_path):
+    source = write_jsonl(tmp_path / "users.jsonl", [])
+
+    with pytest.raises(ValidationError, match="cannot be combined with depends_on"):
+        Job(
+            name="job",
+            tasks=[
+                {"name": "a"},
+                {"depends_on": ["a"], "parametrize": {"source": source}},
+            ],
+        )
+
+    # ヘッダや最初の行に、urlのキーワードの列が無い
+    csv_path = tmp_path / "users.csv"
+    csv_path.write_text("name\na\n")
+    with pytest.raises(ValidationError, match=r"no columns for url keywords: \['id'\]"):
+        Job(name="job", tasks=[{"url": "/{id}", "parametrize": {"source": csv_path}}])
+    Job(
+        name="job",
+        tasks=[
+            {
+                "url": "/{id}",
+                "kwargs": {"id": 1},
+                "parametrize": {"source": csv_path},
+            }
+        ],
+    )
+
+    with pytest.raises(ValidationError, match="cannot be combined with content"):
+        Job(
+            name="job",
+            tasks=[
+                {
+                    "content": "body",
+                    "parametrize": {"source": source, "extra": "json"},
+                }
+            ],
+        )
+
+    with pytest.raises(ValidationError, match="cannot guess the format"):
+        (tmp_path / "users.txt").write_text("")
+        Job(
+            name="job",
+            tasks=[{"parametrize": {"source": str(tmp_path / "users.txt")}}],
+        )
+
+
+@pytest.mark.parametrize("load", [None, {"rate": 200, "duration": 0.1}])
+def test_parametrize_run(tmp_path, load):
+    source = tmp_path / "users.csv"
+    source.write_text("id,q\n" + "".join(f"{i},{i * 2}\n" for i in range(20)))
+
+    RECEIVED.clear()
+    job = HttpxJob.parse_dict(
+        {
+            "base_url": "http://stub",
+            "transport": {
+                "type": "requests_job:StubTransport",
+                "kwargs": {"routes": [{"path": "/users/{id}", "json": {}}]},
+            },
+            "jobs": [
+                {
+                    "name": "job",
+                    "concurrency": 4,
+                    "load": load,
+                    "tasks": [
+                        {
+                            "url": "/users/{id}",
+                            "parametrize": {"source": str(source)},
+                            "event_hooks": {
+                                "request": ["tests.test_parametrize:record"]
+                            },
+                        }
+                    ],
+                }
+            ],
+        }
+    )
+    job.run()
+
+    if load is None:
+        assert RECEIVED == [f"http://stub/users/{i}?q={i * 2}" for i in range(20)]
+    else:
+        # 負荷試験では行を先頭から繰り返して送信する
+        assert len(RECEIVED) == 20
+        assert sorted(set(RECEIVED)) == sorted(
+            f"http://stub/users/{i}?q={i * 2}" for i in range(20)
+        )
+
+
+def test_parametrize_invalid_row(tmp_path, capsys):
+    source = write_jsonl(tmp_path / "users.jsonl", [{"id": 1}, {"q": 2}, {"id": 3}])
+
+    RECEIVED.clear()
+    job = HttpxJob.parse_dict(
+        {
+            "base_url": "http://stub",
+            "transport": {
+                "type": "requests_job:StubTransport",
+                "kwargs": {"routes": [{"path": "/users/{id}", "json": {}}]},
+            },
+            "jobs": [
+                {
+                    "name": "job",
+                    "tasks": [
+                        {
+                            "url": "/users/{id}",
+                            "parametrize": {"source": source},
+                            "event_hooks": {
+                                "request": ["tests.test_parametrize:record"]
+                            },
+                        }
+                    ],
+                }
+            ],
+        }
+    )
+    with pytest.raises(JobError):
+        job.run()
+
+    # 不正な行でジョブを中断せず、残りの行を送信する
+    assert RECEIVED == ["http://stub/users/1", "http://stub/users/3"]
+    assert "row 1: ValueError: required kwargs" in capsys.readouterr().out
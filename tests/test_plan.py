@@ -0,0 +1,93 @@
+import pytest
+
+from requests_job.plan import JobPlan, TaskPlan
+from requests_job.schemas import Job, Profile, Task
+
+
+def create_profile():
+    return Profile(
+        base_url="http://testserver",
+        headers={"a": "1"},
+        jobs=[
+            {
+                "name": "job_1",
+                "headers": {"b": "2"},
+                "tasks": [
+                    {"name": "first", "url": "/get_record/1"},
+                    {"name": "second", "url": "/get_record/2", "depends_on": ["first"]},
+                ],
+            },
+            {
+                "name": "job_2",
+                "tasks": [
+                    {
+                        "url": "/file/upload_multiple",
+                        "method": "post",
+                        "files": [
+                            {"key": "files", "path": "tests/mock/files/sample_1.txt"}
+                        ],
+                    }
+                ],
+            },
+        ],
+    )
+
+
+def test_plan():
+    profile = create_profile()
+    plan = profile.get_plan()
+    assert profile.get_plan() is plan
+
+    job_1, job_2 = plan.jobs
+    assert isinstance(job_1, JobPlan)
+    assert job_1.name == "job_1"
+    assert job_1.job.headers == {"a": "1", "b": "2"}
+    assert job_1.dependencies == ((), (0,))
+
+    first, second = job_1.tasks
+    assert isinstance(first, TaskPlan)
+    assert first.name == "first"
+    assert first.build_request_args() is first.build_request_args()
+    assert first.build_request_args()["url"] == "/get_record/1"
+
+    # 不変である
+    with pytest.raises(AttributeError):
+        first.name = "changed"  # type: ignore
+    with pytest.raises(TypeError):
+        first.build_request_args()["url"] = "/changed"  # type: ignore
+
+    # ファイルの本文はリクエストごとに作り直す
+    upload = job_2.tasks[0]
+    assert upload.request_args is None
+    assert (
+        upload.build_request_args()["content"]
+        is not upload.build_request_args()["content"]
+    )
+
+    profile.clear_plan()
+    assert profile.get_plan() is not plan
+
+
+def test_plan_merges_once(monkeypatch):
+    counts = {"job": 0, "task": 0}
+    job_merge_parent = Job.merge_parent
+    task_merge_parent = Task.merge_parent
+
+    def count_job(self, parent):
+        counts["job"] += 1
+        return job_merge_parent(self, parent)
+
+    def count_task(self, parent):
+        counts["task"] += 1
+        return task_merge_parent(self, parent)
+
+    monkeypatch.setattr(Job, "merge_parent", count_job)
+    monkeypatch.setattr(Task, "merge_parent", count_task)
+
+    profile = create_profile()
+    for _ in range(3):
+        for job in profile.get_plan().jobs:
+            for task in job.tasks:
+                task.build_request_args()
+
+    assert counts == {"job": 2, "task": 3}
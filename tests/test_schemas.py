@@ -0,0 +1,137 @@
+import pickle
+
+import pytest
+from pydantic import ValidationError
+
+from requests_job.schemas import Job, Profile, Task
+
+
+def test_depends_on():
+    job = Job(name="job", tasks=[{"name": "a"}, {"name": "b"}])
+    assert job.get_dependencies() is None
+
+    job = Job(name="job", tasks=[{"name": "a"}, {"name": "b", "depends_on": ["a"]}])
+    assert job.get_dependencies() == [[], [0]]
+
+    with pytest.raises(ValidationError, match="unknown task"):
+        Job(name="job", tasks=[{"name": "a", "depends_on": ["b"]}])
+
+    with pytest.raises(ValidationError, match="ambiguous task"):
+        Job(name="job", tasks=[{"name": "a"}, {"name": "a"}, {"depends_on": ["a"]}])
+
+    with pytest.raises(ValidationError, match="itself"):
+        Job(name="job", tasks=[{"name": "a", "depends_on": ["a"]}])
+
+    with pytest.raises(ValidationError, match="circular dependency"):
+        Job(
+            name="job",
+            tasks=[
+                {"name": "a", "depends_on": ["c"]},
+                {"name": "b", "depends_on": ["a"]},
+                {"name": "c", "depends_on": ["b"]},
+                {"name": "d"},
+            ],
+        )
+
+
+def test_merge_parent():
+    profile = Profile(
+        headers={"a": "1"},
+        timeout=3,
+        event_hooks={"request": ["requests_job.eventhooks:debug_request"]},
+        transport={"type": "requests_job:StubTransport", "kwargs": {"routes": []}},
+        jobs=[
+            {
+                "name": "job",
+                "headers": {"b": "2"},
+                "params": {"q": "1"},
+                "event_hooks": {"response": ["requests_job.eventhooks:debug_response"]},
+                "transport": {"type": "requests_job:CassetteTransport"},
+                "tasks": [
+                    {
+                        "name": "task",
+                        "url": "/get_record/1",
+                        "params": {"r": "2"},
+                        "headers": {"c": "3"},
+                        "event_hooks": {"request": []},
+                        "files": [
+                            {"key": "f", "path": "tests/mock/files/sample_1.txt"}
+                        ],
+                    }
+                ],
+            }
+        ],
+    )
+    job = next(profile.jobs)
+    assert job.headers == {"a": "1", "b": "2"}
+    assert job.timeout == 3
+    assert job.transport.type.__root__ == "requests_job:CassetteTransport"
+    # transportは種類ごとに引数が異なるため、子の値で丸ごと置き換える
+    assert job.transport.kwargs is None
+    assert job.event_hooks.request == profile.event_hooks.request
+    assert job.event_hooks.response == profile.nodes[0].event_hooks.response
+    assert {"timeout", "transport", "params"} <= job.__fields_set__
+
+    task = next(job.tasks)
+    assert task.params == {"q": "1", "r": "2"}
+    assert task.headers == {"a": "1", "b": "2", "c": "3"}
+    assert task.event_hooks.request == []
+    assert task.event_hooks.response == job.event_hooks.response
+    assert task.url.__root__ == "/get_record/1"
+
+
+def test_merge_parent_load():
+    profile = Profile(
+        load={"stages": [{"duration": 1, "target": 5}]},
+        jobs=[
+            {"name": "a", "load": {"rate": 10, "duration": 1}},
+            {"name": "b"},
+        ],
+    )
+    a, b = profile.jobs
+    assert a.load.stages == []
+    assert [x.target for x in a.load.get_stages()] == [10]
+    assert b.load == profile.load
+
+
+def test_merge_parent_without_validation(monkeypatch):
+    profile = Profile(
+        jobs=[
+            {
+                "name": "job",
+                "tasks": [
+                    {"files": [{"key": "f", "path": "tests/mock/files/sample_1.txt"}]}
+                ],
+            }
+        ]
+    )
+
+    def fail(*args, **kwargs):
+        raise AssertionError("validated again")
+
+    # 継承したモデルは検証済みの値から組み立てられる
+    monkeypatch.setattr(Task, "__init__", fail)
+    monkeypatch.setattr(Job, "__init__", fail)
+    for job in profile.jobs:
+        for task in job.tasks:
+            assert task.files.__root__[0].key == "f"
+
+
+def test_task_kwargs():
+    task = Task(url="/get_record/{id:03d}", kwargs={"id": 1, "q": "a"})
+    assert task.url.__root__ == "/get_record/001"
+    assert task.params == {"q": "a"}
+    assert task.kwargs is None
+
+
+def test_task_kwargs_literal():
+    # 埋め込んだ値やエスケープした{}は、テンプレートとして再解釈されない
+    task = Task(url="/x/{id}", kwargs={"id": "a{b"})
+    assert task.url.__root__ == "/x/a{b"
+    assert task.url.keywords == frozenset()
+    assert task.build_request_args()["url"] == "/x/a{b"
+
+    task = Task(url="/x/{{literal}}")
+    assert task.url.__root__ == "/x/{literal}"
+    assert task.url.keywords == frozenset()
+    assert pickle.loads(pickle.dumps(task)).url.format() == "/x/{literal}"
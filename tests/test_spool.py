@@ -0,0 +1,102 @@
+import gc
+import json
+
+import pytest
+
+from requests_job import ASGITransportLifespan
+from requests_job.client import AsyncClientWrapper
+from requests_job.spool import (
+    SpooledBody,
+    get_body,
+    get_json,
+    get_spool,
+    get_text,
+    iter_text,
+)
+
+
+def create_client():
+    from tests.mock import app
+
+    return AsyncClientWrapper(
+        transport=ASGITransportLifespan(app=app), base_url="http://testserver"
+    )
+
+
+@pytest.mark.asyncio
+async def test_spool_large_body():
+    from requests_job.verifier import Verifier
+
+    seen = {}
+
+    def hook(res):
+        body = get_spool(res)
+        seen["spool"] = body
+        seen["size"] = len(get_body(res))
+        seen["head"] = get_body(res)[:10].tobytes()
+
+    expect = {"status_code": 200, "json": {"count": 100, "status": "ok"}}
+    verifier = Verifier(expect)
+    errors = []
+
+    async with create_client() as client:
+        await client.request(
+            {"response": [hook], "expect": [lambda res: errors.extend(verifier(res))]},
+            method="GET",
+            url="/export?count=100",
+            spool_threshold=100,
+        )
+
+    assert isinstance(seen["spool"], SpooledBody)
+    assert seen["size"] > 100
+    assert seen["head"] == b'{"count": '
+    assert errors == []
+
+
+@pytest.mark.asyncio
+async def test_spool_small_body():
+    seen = {}
+
+    def hook(res):
+        seen["spool"] = get_spool(res)
+        seen["content"] = res.content
+
+    async with create_client() as client:
+        # Content-Lengthが閾値以下の場合は、通常どおりresponse.contentに保持する
+        await client.request(
+            {"response": [hook]},
+            method="GET",
+            url="/",
+            spool_threshold=10000,
+        )
+        assert seen["spool"] is None
+        assert seen["content"]
+
+        res = await client.request(
+            method="GET", url="/export?count=1", spool_threshold=10000
+        )
+
+    assert not isinstance(get_spool(res), SpooledBody)
+    assert get_body(res).tobytes().startswith(b'{"count": 1')
+    assert get_json(res)["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_spool_after_request():
+    async with create_client() as client:
+        res = await client.request(
+            method="GET", url="/export?count=1000", spool_threshold=100
+        )
+
+    body = get_spool(res)
+    assert isinstance(body, SpooledBody)
+    text = get_text(res)
+    assert "".join(iter_text(res, chunk_size=7)) == text
+    assert get_body(res).tobytes() == text.encode()
+    assert get_json(res) == json.loads(text)
+    assert get_json(res)["items"][999] == {"id": 999, "name": "record_999"}
+
+    # 一時ファイルはレスポンスが破棄された時点で閉じる
+    del res
+    gc.collect()
+    assert body.file.closed
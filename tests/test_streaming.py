@@ -0,0 +1,130 @@
+import hashlib
+import json
+
+import pytest
+
+from requests_job.exceptions import FailJSONDecode
+from requests_job.streaming import BodyAccumulator, JsonStreamParser, wanted_paths
+
+
+def test_wanted_paths():
+    expect = {"a": 1, "b": {"c": [1], "d": {"e": None}}}
+    assert wanted_paths(expect) == {("a",), ("b", "c"), ("b", "d", "e")}
+    assert wanted_paths([1, 2]) == {()}
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_json_stream_parser_split(size):
+    doc = {
+        "skip": {"x": [1, 2, {"y": 'a\\"b'}], "z": -1.5e3},
+        "items": [{"id": 1, "name": "あ"}, {"id": 2, "name": None}],
+        "nested": {"flag": True, "other": "skip"},
+        "last": 100,
+    }
+    text = json.dumps(doc, ensure_ascii=False)
+    parser = JsonStreamParser({("items",), ("nested", "flag"), ("last",)})
+    for i in range(0, len(text), size):
+        parser.feed(text[i : i + size])
+
+    assert parser.close() == {
+        ("items",): doc["items"],
+        ("nested", "flag"): True,
+        ("last",): 100,
+    }
+
+
+@pytest.mark.parametrize("text", ['{"a": 1', '{"a" 1}', '{"a": 1} 2', "[1,]"])
+def test_json_stream_parser_invalid(text):
+    parser = JsonStreamParser({("a",)})
+    with pytest.raises(ValueError):
+        parser.feed(text)
+        parser.close()
+
+
+def test_json_stream_parser_string():
+    parser = JsonStreamParser({("a",), ('k"',)})
+    for char in r'{"a": "x\u00e9\"y\\", "k\"": 1}':
+        parser.feed(char)
+    assert parser.close() == {("a",): 'xé"y\\', ('k"',): 1}
+
+    # 取り出さない長い文字列は、チャンクをまたいでも保持しない
+    parser = JsonStreamParser({("b",)})
+    parser.feed('{"a": "')
+    for _ in range(100):
+        parser.feed("x" * 1000)
+        assert parser.buffer == "" and parser.strings is None
+    parser.feed('", "b": "' + "y" * 1000)
+    parser.feed('"}')
+    assert parser.close() == {("b",): "y" * 1000}
+
+
+def test_json_stream_parser_ndjson():
+    parser = JsonStreamParser({("a",)})
+    with pytest.raises(ValueError, match="NDJSON"):
+        parser.feed('{"a":1}\n{"a":2}\n')
+
+
+def test_body_accumulator():
+    body = '{"a": {"b": [1, 2]}, "c": "テキスト"}\nsecond line'.encode()
+    acc = BodyAccumulator({"a": {"b": [1, 2]}})
+    for i in range(0, len(body), 4):
+        acc.feed(body[i : i + 4])
+
+    result = acc.result()
+    assert result["size"] == len(body)
+    assert result["sha256"] == hashlib.sha256(body).hexdigest()
+    assert result["lines"] == 2
+    # 2行目はJSONとして不正
+    assert isinstance(result["json"], FailJSONDecode)
+
+    acc = BodyAccumulator({"a": {"b": None}})
+    acc.feed(body.split(b"\n")[0])
+    assert acc.result()["json"] == {"a": {"b": [1, 2]}}
+
+
+def create_stream_profile(expect, url="/export?count=3"):
+    from requests_job import HttpxJob
+
+    return HttpxJob.parse_dict(
+        {
+            "transport": {
+                "type": "requests_job:ASGITransportLifespan",
+                "kwargs": {"app": "tests.mock:app"},
+            },
+            "base_url": "http://testserver",
+            "jobs": [
+                {
+                    "name": "stream",
+                    "tasks": [{"url": url, "stream": True, "expect": expect}],
+                }
+            ],
+        }
+    )
+
+
+def test_stream_task(capsys):
+    expect = {
+        "status_code": 200,
+        "lines": 1,
+        "json": {"count": 3, "status": "ok", "items": [{"id": 0, "name": "record_0"}]},
+    }
+    create_stream_profile(expect).run()
+    captured = capsys.readouterr().out
+    assert "SizeMismatch" in captured
+
+    expect["json"]["items"] = [{"id": i, "name": f"record_{i}"} for i in range(3)]
+    create_stream_profile(expect).run()
+    assert "Mismatch" not in capsys.readouterr().out
+
+
+def test_stream_task_content_not_available(capsys):
+    create_stream_profile({"text": ""}).run()
+    assert "text is not available in stream mode." in capsys.readouterr().out
+
+
+def test_stream_task_ndjson(capsys):
+    expect = {"lines": 3, "json": {"id": 0}}
+    create_stream_profile(expect, "/export/ndjson").run()
+    captured = capsys.readouterr().out
+    assert "json is not available for application/x-ndjson" in captured
+    assert "SizeMismatch" not in captured
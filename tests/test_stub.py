@@ -0,0 +1,113 @@
+import time
+
+import httpx
+import pytest
+
+from requests_job import HttpxJob, StubTransport
+
+ROUTES = [
+    {"path": "/users", "method": ["GET", "POST"], "json": []},
+    {"path": "/users/me", "json": {"id": "me"}},
+    {"path": "/users/{id}", "json": {"id": "{id}", "tags": ["user_{id}"]}},
+    {"path": "/users/{id}/items/{item}", "text": "{id}:{item}", "status_code": 201},
+    {"path": "/slow", "latency": 0.05},
+]
+
+
+@pytest.mark.asyncio
+async def test_stub_transport():
+    transport = StubTransport(ROUTES)
+    async with httpx.AsyncClient(transport=transport, base_url="http://stub") as client:
+        assert (await client.get("/users")).json() == []
+        assert (await client.post("/users")).json() == []
+        # 固定のセグメントはパスパラメータより優先される
+        assert (await client.get("/users/me")).json() == {"id": "me"}
+        assert (await client.get("/users/1")).json() == {"id": "1", "tags": ["user_1"]}
+
+        res = await client.get("/users/1/items/2?q=1")
+        assert res.status_code == 201
+        assert res.text == "1:2"
+
+        assert (await client.get("/unknown")).status_code == 404
+        assert (await client.delete("/users/1")).status_code == 405
+
+        start = time.perf_counter()
+        await client.get("/slow")
+        assert time.perf_counter() - start >= 0.05
+
+
+def test_stub_duplicate_route():
+    with pytest.raises(ValueError, match="duplicate route"):
+        StubTransport([{"path": "/a"}, {"path": "/a/", "method": "GET"}])
+
+    with pytest.raises(ValueError, match="conflicting path parameters"):
+        StubTransport([{"path": "/a/{x}"}, {"path": "/a/{y}/b"}])
+
+
+@pytest.mark.asyncio
+async def test_stub_literal_braces():
+    routes = [
+        {"path": "/ok", "text": '{"ok": {"nested": true}}'},
+        {"path": "/items/{id}", "text": '{"id": "{id}", "empty": {}}'},
+    ]
+    transport = StubTransport(routes)
+    async with httpx.AsyncClient(transport=transport, base_url="http://stub") as client:
+        assert (await client.get("/ok")).json() == {"ok": {"nested": True}}
+        assert (await client.get("/items/1")).json() == {"id": "1", "empty": {}}
+
+
+def test_stub_unknown_placeholder():
+    with pytest.raises(ValueError, match="unknown path parameters"):
+        StubTransport([{"path": "/users/{id}", "text": "{other}"}])
+
+    with pytest.raises(ValueError, match="unknown path parameters"):
+        StubTransport([{"path": "/users", "json": {"id": ["{id}"]}}])
+
+
+def test_stub_latency_distribution():
+    from requests_job.stub import StubRoute
+
+    route = {
+        "path": "/",
+        "latency": {"distribution": "uniform", "min": 0.1, "max": 0.2},
+    }
+    a = StubTransport([route], seed=1).trie.match("/")[0].methods["GET"]
+    b = StubTransport([route], seed=1).trie.match("/")[0].methods["GET"]
+    values = [a.latency() for _ in range(10)]
+    assert values == [b.latency() for _ in range(10)]
+    assert all(0.1 <= x <= 0.2 for x in values)
+    assert StubRoute(path="/").latency == 0
+
+
+def test_stub_many_routes():
+    routes = [{"path": f"/resource_{i}/{{id}}/child_{i}"} for i in range(5000)]
+    trie = StubTransport(routes).trie
+    node, params = trie.match("/resource_4999/10/child_4999")
+    assert params == {"id": "10"}
+    assert trie.match("/resource_4999/10/child_0") is None
+
+
+def test_stub_job(capsys):
+    job = HttpxJob.parse_dict(
+        {
+            "transport": {
+                "type": "requests_job:StubTransport",
+                "kwargs": {"routes": ROUTES},
+            },
+            "base_url": "http://stub",
+            "jobs": [
+                {
+                    "name": "stub",
+                    "tasks": [
+                        {
+                            "url": "/users/{id}",
+                            "kwargs": {"id": 5},
+                            "expect": {"status_code": 200, "json": {"id": "5"}},
+                        }
+                    ],
+                }
+            ],
+        }
+    )
+    job.run()
+    assert "Mismatch" not in capsys.readouterr().out
@@ -11,6 +11,8 @@ def test_merge_objects():
         {"a": [1], "b": {1}, "c": {"a": 1}}, {"a": [2], "b": {2}, "c": {"b": 2}, "d": 2}
     ) == {"a": [1, 2], "b": {1, 2}, "c": {"a": 1, "b": 2}, "d": 2}
 
+    assert merge_objects({"a": None}, {"a": {"b": 1}}) == {"a": {"b": 1}}
+
     a = {}
     b = {}
     c = merge_objects(a, b)
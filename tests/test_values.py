@@ -17,3 +17,62 @@ def test_AttrPath():
         AttrPath("asyncio:")
 
     assert isinstance(AttrPath("asyncio:run").value, AttrInfo)
+
+
+def test_AttrPath_cache(tmp_path, monkeypatch):
+    import importlib
+    import pickle
+
+    (tmp_path / "attr_cache_module.py").write_text("def func():\n    return 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    path = AttrPath("attr_cache_module:func")
+    info = path.value
+    assert path.value is info
+    assert AttrPath("attr_cache_module:func").value is info
+    assert info.attr() == 1
+
+    # 解決結果はpickleされない
+    restored = pickle.loads(pickle.dumps(path))
+    assert restored._info is None
+    assert restored.value is info
+
+    # モジュールを再読み込みした場合は、明示的にキャッシュを破棄する
+    (tmp_path / "attr_cache_module.py").write_text("def func():\n    return 10\n")
+    importlib.invalidate_caches()
+    importlib.reload(info.module)
+    assert path.value.attr() == 1
+
+    AttrPath.clear_cache("attr_cache_module")
+    assert path.value is not info
+    assert path.value.attr() == 10
+    assert AttrPath("asyncio:run").value is AttrPath("asyncio:run").value
+
+
+def test_FString():
+    import pickle
+
+    from requests_job.values import FString
+
+    template = "/users/{id:05d}/{name!r}/{{escaped}}/{obj.real}/{arr[0]}/{x:>{width}}"
+    s = FString(template)
+    assert s.keywords == {"id", "name", "obj", "arr", "x", "width"}
+
+    kwargs = dict(id=7, name="a", obj=3, arr=[9], x="y", width=3)
+    assert s.format(**kwargs, extra=1) == template.format(**kwargs)
+    assert s.format_map(kwargs) == "/users/00007/'a'/{escaped}/3/9/  y"
+    assert s.pull_kwargs({"id": 1, "extra": 2}) == {"id": 1}
+
+    with pytest.raises(ValueError, match="required kwargs"):
+        s.format(id=1)
+
+    assert FString("/static/{{x}}").keywords == set()
+    assert FString("/static/{{x}}").format() == "/static/{x}"
+
+    # 同じテンプレートは一度だけ解析される
+    assert FString(template).template is s.template
+    assert pickle.loads(pickle.dumps(s)).template is s.template
+
+    for invalid in ["{}", "/{0}", "/{", "{x!z}", "{x[}"]:
+        with pytest.raises(ValueError):
+            FString(invalid)
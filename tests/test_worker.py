@@ -0,0 +1,224 @@
+import asyncio
+import importlib
+
+import pytest
+
+from requests_job import HttpxJob
+
+
+def create_profile(**kwargs):
+    profile = {
+        "transport": {
+            "type": "requests_job:ASGITransportLifespan",
+            "kwargs": {"app": "tests.mock:app"},
+        },
+        "base_url": "http://testserver",
+        "jobs": [
+            {"name": "job_1", "tasks": [{"url": "/get_record/1"}]},
+            {"name": "job_2", "tasks": [{"url": "/get_record/2"}]},
+        ],
+    }
+    profile.update(kwargs)
+    return HttpxJob.parse_dict(profile)
+
+
+def test_run():
+    job = create_profile()
+    job.run()
+
+
+@pytest.mark.asyncio
+async def test_arun_in_running_loop():
+    job = create_profile()
+    await job.arun()
+
+    # 実行中のイベントループ内からでも同期的に実行できる
+    job.run()
+    assert asyncio.get_running_loop()
+
+
+@pytest.mark.asyncio
+async def test_bounded_map_keeps_order():
+    from requests_job.scheduler import bounded_map
+    from requests_job.worker import Token
+
+    running = 0
+    max_running = 0
+
+    async def func(x):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01 * (5 - x))
+        running -= 1
+        return x
+
+    results = []
+    await bounded_map(func, range(5), 3, Token(), callback=results.append)
+    assert results == [0, 1, 2, 3, 4]
+    assert max_running == 3
+
+
+@pytest.mark.asyncio
+async def test_bounded_map_max_pending():
+    from requests_job.scheduler import bounded_map
+    from requests_job.worker import Token
+
+    pulled = []
+
+    def source():
+        for x in range(20):
+            pulled.append(x)
+            yield x
+
+    async def func(x):
+        # 先頭の要素だけが遅い
+        await asyncio.sleep(0.1 if x == 0 else 0)
+        return x
+
+    results = []
+    task = asyncio.ensure_future(
+        bounded_map(func, source(), 3, Token(), callback=results.append, max_pending=4)
+    )
+    await asyncio.sleep(0.05)
+    # 保留している結果が上限に達すると、新しい要素を取り出さない
+    assert results == []
+    assert len(pulled) <= 4 + 3
+    await task
+    assert results == list(range(20))
+
+    results = []
+    await bounded_map(
+        func, range(5), 3, Token(), callback=results.append, ordered=False
+    )
+    assert results == [1, 2, 3, 4, 0]
+
+
+@pytest.mark.asyncio
+async def test_bounded_map_cancel():
+    from requests_job.scheduler import bounded_map
+    from requests_job.worker import Token
+
+    token = Token()
+    results = []
+
+    async def func(x):
+        if x == 2:
+            token.is_cancelled = True
+        return x
+
+    await bounded_map(func, range(10), 1, token, callback=results.append)
+    assert results == [0, 1, 2]
+
+
+def test_concurrency():
+    import time
+
+    tasks = [{"url": "/wait", "method": "post", "json": {"wait": 0.2}}] * 5
+    job = create_profile(jobs=[{"name": "wait", "concurrency": 5, "tasks": tasks}])
+
+    start = time.perf_counter()
+    job.run()
+    assert time.perf_counter() - start < 0.2 * 5
+
+
+def create_parallel_jobs():
+    return [
+        {
+            "name": "fail",
+            "transport": None,
+            "verify": False,
+            "tasks": [{"event_hooks": {"request": ["json:loads"]}}],
+        },
+        {
+            "name": "wait",
+            "tasks": [{"url": "/wait", "method": "post", "json": {"wait": 0.1}}],
+        },
+    ]
+
+
+def test_parallel_jobs():
+    from requests_job.exceptions import JobError
+
+    jobs = create_parallel_jobs()
+    job = create_profile(jobs=jobs, parallel_jobs=2)
+
+    with pytest.raises(JobError, match="fail") as e:
+        job.run()
+
+    results = e.value.results
+    assert [x.name for x in results] == ["fail", "wait"]
+    assert not results[0].is_success
+    assert results[1].is_success
+
+
+def test_parallel_jobs_fail_fast():
+    jobs = create_parallel_jobs()
+    job = create_profile(jobs=jobs, parallel_jobs=2, fail_fast=True)
+
+    with pytest.raises(TypeError):
+        job.run()
+
+
+@pytest.mark.asyncio
+async def test_run_graph():
+    from requests_job.scheduler import run_graph
+    from requests_job.worker import Token
+
+    events = []
+
+    async def func(x):
+        events.append(("start", x))
+        await asyncio.sleep(0.01)
+        events.append(("end", x))
+        return x
+
+    # 0 -> (1, 2) -> 3
+    predecessors = [[], [0], [0], [1, 2]]
+    results = []
+    await run_graph(func, range(4), predecessors, 10, Token(), callback=results.append)
+
+    assert results == [0, 1, 2, 3]
+    assert events[:4] == [("start", 0), ("end", 0), ("start", 1), ("start", 2)]
+    assert events[-2:] == [("start", 3), ("end", 3)]
+
+
+def test_depends_on():
+    tasks = [
+        {"name": "login", "url": "/get_record/1"},
+        {"name": "a", "url": "/get_record/2", "depends_on": ["login"]},
+        {"name": "b", "url": "/get_record/3", "depends_on": ["login"]},
+        {"name": "c", "url": "/get_record/4", "depends_on": ["a", "b"]},
+    ]
+    job = create_profile(jobs=[{"name": "graph", "concurrency": 2, "tasks": tasks}])
+    assert next(job.profile.jobs).get_dependencies() == [[], [0], [0], [1, 2]]
+    job.run()
+
+
+@pytest.mark.parametrize("parallel_jobs", [1, 2])
+def test_shared_lifespan(parallel_jobs):
+    app = importlib.import_module("tests.mock.app")
+    app.clear_count()
+    job = create_profile(parallel_jobs=parallel_jobs)
+    job.run()
+
+    # 同じアプリケーションを使うジョブ間で、lifespanは一度だけ実行される
+    assert app.count_startup == 1
+    assert app.count_shutdown == 1
+
+
+@pytest.mark.asyncio
+async def test_lifespan_registry():
+    from requests_job import ASGITransportLifespan
+    from requests_job.transport import get_lifespan_registry
+
+    app = importlib.import_module("tests.mock.app")
+    app.clear_count()
+    transports = [ASGITransportLifespan(app="tests.mock:app") for _ in range(3)]
+    await asyncio.gather(*(x.__aenter__() for x in transports))
+    assert app.count_startup == 1
+
+    for transport in transports:
+        await transport.__aexit__(None, None, None)
+    assert app.count_shutdown == 1
+    assert get_lifespan_registry().entries == {}
@@ -41,3 +41,28 @@ def test_parser():
     result = Parser.parse_str(content)
     assert result != "${PATH}"
     assert isinstance(result, EvalStr)
+
+
+@pytest.mark.skipif(not yaml.__with_libyaml__, reason="libyaml is not available")
+def test_c_loader():
+    from requests_job import Parser
+    from requests_job.parser import AppLoader, CAppLoader, PyAppLoader
+    from requests_job.sandbox import EvalStr
+
+    # libyamlが利用できる場合は自動的に選択される
+    assert AppLoader is CAppLoader
+    assert CAppLoader.Dumper is not PyAppLoader.Dumper
+
+    content = "a: ${PATH}\nb: !ref x\nc: !call y\nd: !!python/tuple [1, 2]\n"
+    results = [Parser.parse_str(content, loader=x) for x in (PyAppLoader, CAppLoader)]
+    assert results[0] == results[1]
+    assert [type(x) for x in results[0].values()] == [
+        type(x) for x in results[1].values()
+    ]
+    assert isinstance(results[1]["a"], EvalStr)
+
+    with open("tests/mock.yaml") as f:
+        content = f.read()
+    assert Parser.parse_str(content, loader=PyAppLoader) == Parser.parse_str(
+        content, loader=CAppLoader
+    )